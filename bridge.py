@@ -1,8 +1,12 @@
 import asyncio
+import functools
+import bisect
 import logging
 import time
 import re
-from typing import Dict, List, Optional
+import textwrap
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple, Union
 from dataclasses import dataclass, field
 
 from matrix_bot import MatrixBot
@@ -14,28 +18,127 @@ import config
 
 logger = logging.getLogger(__name__)
 
+# Seconds to collect state changes before writing them in one transaction
+PERSIST_DELAY = 0.2
+# Queued state changes that trigger a write without waiting for PERSIST_DELAY
+PERSIST_BATCH_MAX = 100
+
+# Legacy/bridge reaction format: "[Reaction to <packet id>]: <emoji>"
+_REACTION_PREFIX = "[Reaction to "
+_REACTION_RE = re.compile(r"^\[Reaction to (\d+)\]: (.+)$")
+# Any ASCII letter; short texts without one are treated as emoji reactions
+_LETTER_RE = re.compile(r'[a-zA-Z]')
+# Reply fallback pieces (see _build_quote)
+_MATRIX_TO = "https://matrix.to/#/"
+_MX_REPLY_OPEN = "<mx-reply><blockquote>"
+_MX_REPLY_CLOSE = "</blockquote></mx-reply>"
+# Characters of the parent message kept in a reply quote
+QUOTE_MAX_CHARS = 50
+# Single-pass escaping for mesh-provided text and node names placed into Matrix HTML
+_HTML_ESCAPE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'})
+
+
+def _rssi_desc(stats: ReceptionStats) -> int:
+    """Sort key keeping reception lists ordered by RSSI, strongest first."""
+    return -stats.rssi
+
+
+def _parse_reaction(text: str) -> Optional[Tuple[str, str]]:
+    """Split a legacy "[Reaction to <id>]: <emoji>" text into (id, emoji), or None.
+
+    Well-formed texts are handled with plain string operations; the regex is
+    only consulted for anything unusual.
+    """
+    if not text.startswith(_REACTION_PREFIX):
+        return None
+    target_id, sep, emoji = text[len(_REACTION_PREFIX):].partition("]: ")
+    if sep and target_id.isdecimal() and emoji and "\n" not in emoji:
+        return target_id, emoji
+    match = _REACTION_RE.match(text)
+    return match.groups() if match else None
+
+
+def _escape_html(text: str) -> str:
+    return text.translate(_HTML_ESCAPE)
+
+
+def _shorten(text: str) -> str:
+    """Shorten text to QUOTE_MAX_CHARS at a word boundary for reply quotes."""
+    short = textwrap.shorten(text, width=QUOTE_MAX_CHARS, placeholder='…')
+    if short == '…':
+        # A single word longer than the limit: textwrap would leave only the placeholder
+        short = text[:QUOTE_MAX_CHARS - 1] + '…'
+    return short
+
+
+def _split_utf8(encoded: bytes, max_len: int) -> List[str]:
+    """Split UTF-8 bytes into decoded parts of at most max_len bytes each.
+
+    Cuts only on character boundaries, so multi-byte characters (emoji,
+    umlauts, ...) are never split or dropped. Parts are decoded straight
+    from a memoryview, so no intermediate bytes chunks are copied.
+    """
+    parts = []
+    with memoryview(encoded) as view:
+        size = len(view)
+        start = 0
+        while start < size:
+            end = min(start + max_len, size)
+            # Walk back while the cut lands on a continuation byte (0b10xxxxxx)
+            while end < size and (view[end] & 0xC0) == 0x80:
+                end -= 1
+            parts.append(str(view[start:end], 'utf-8'))
+            start = end
+    return parts
 
 
 class MeshtasticMatrixBridge:
     def __init__(self):
         self.node_db = NodeDatabase()
-        self.message_state: Dict[int, MessageState] = self.node_db.load_message_states()
+        # Least recently used first; bounded by config.MESSAGE_STATE_LIMIT
+        self.message_state: OrderedDict[int, MessageState] = OrderedDict(
+            self.node_db.load_message_states(limit=config.MESSAGE_STATE_LIMIT)
+        )
         
         # Determine last packet ID based on last_update timestamp
         self.last_packet_id: Optional[int] = None
         if self.message_state:
-            # Sort states by last_update descending
-            sorted_states = sorted(self.message_state.values(), key=lambda s: s.last_update, reverse=True)
-            self.last_packet_id = sorted_states[0].packet_id
-            logger.info(f"Restored last_packet_id: {self.last_packet_id}")
+            newest = max(self.message_state.values(), key=lambda s: s.last_update)
+            self.last_packet_id = newest.packet_id
+            logger.info("Restored last_packet_id: %s", self.last_packet_id)
+
+        # Reverse index: Matrix event ID -> packet ID (for reactions and replies from Matrix)
+        self.event_to_packet: Dict[str, int] = {
+            state.matrix_event_id: pid for pid, state in self.message_state.items() if state.matrix_event_id
+        }
+
+        # Node ID -> display name for every known node, kept current by handle_node_info
+        self._name_cache: Dict[str, str] = self.node_db.load_all_names()
+        # Bumped whenever a node name may have changed, invalidating rendered stats
+        self._names_version = 0
+
+        # Packets currently being relayed; later copies wait on the shared condition
+        self._in_flight: Set[int] = set()
+        self._in_flight_cv = asyncio.Condition()
+
+        # Debounced Matrix edits for duplicate bursts (packet ID -> timer)
+        self._pending_edits: Dict[int, asyncio.TimerHandle] = {}
+        self._background_tasks: Set[asyncio.Task] = set()
+
+        # MessageStates waiting to be written to the database (packet ID -> state)
+        self._dirty: Dict[int, MessageState] = {}
+        self._persist_event = asyncio.Event()
+        self._persist_full = asyncio.Event()
+        self._persist_task: Optional[asyncio.Task] = None
 
-        self.processing_packets: Dict[int, asyncio.Event] = {} # Track packets being processed
         self.matrix_bot = MatrixBot(self)
         self.mqtt_client = MqttClient(self)
         self.meshtastic_interface = MeshtasticInterface(self)
         
     async def start(self):
         logger.info("Starting Meshtastic-Matrix Bridge...")
+        self.node_db.start_writer()
+        self._persist_task = asyncio.create_task(self._persist_loop())
         await self.matrix_bot.start()
         self.mqtt_client.start()
         self.meshtastic_interface.start()
@@ -44,8 +147,56 @@ class MeshtasticMatrixBridge:
         logger.info("Stopping Bridge...")
         self.mqtt_client.stop()
         self.meshtastic_interface.stop()
+        await self._flush_pending_edits()
+        if self._persist_task:
+            self._persist_task.cancel()
+        self._flush_dirty()
+        await asyncio.to_thread(self.node_db.close)
         await self.matrix_bot.stop()
 
+    def _remember_state(self, state: MessageState):
+        """Track a MessageState, evicting the least recently used ones over the limit."""
+        self.message_state[state.packet_id] = state
+        self.message_state.move_to_end(state.packet_id)
+        while len(self.message_state) > config.MESSAGE_STATE_LIMIT:
+            _, evicted = self.message_state.popitem(last=False)
+            if evicted.matrix_event_id and self.event_to_packet.get(evicted.matrix_event_id) == evicted.packet_id:
+                del self.event_to_packet[evicted.matrix_event_id]
+            handle = self._pending_edits.pop(evicted.packet_id, None)
+            if handle:
+                handle.cancel()
+
+    def _persist(self, state: MessageState):
+        """Queue a MessageState for the background writer."""
+        self._dirty[state.packet_id] = state
+        self._persist_event.set()
+        if len(self._dirty) >= PERSIST_BATCH_MAX:
+            self._persist_full.set()
+
+    async def _persist_loop(self):
+        """Hand queued MessageStates to the database writer thread in batches."""
+        while True:
+            await self._persist_event.wait()
+            # Give bursts (e.g. duplicates from many gateways) time to coalesce,
+            # unless the batch is already full
+            try:
+                await asyncio.wait_for(self._persist_full.wait(), PERSIST_DELAY)
+            except asyncio.TimeoutError:
+                pass
+            self._persist_event.clear()
+            self._persist_full.clear()
+            self._flush_dirty()
+
+    def _flush_dirty(self):
+        if not self._dirty:
+            return
+        states = list(self._dirty.values())
+        self._dirty.clear()
+        try:
+            self.node_db.queue_message_states(states)
+        except Exception as e:
+            logger.error("Failed to persist %d message states: %s", len(states), e)
+
     async def handle_meshtastic_message(self, packet: dict, source: str, reception_stats: ReceptionStats):
         packet_id = packet.get("id")
         sender = packet.get("fromId")
@@ -65,6 +216,21 @@ class MeshtasticMatrixBridge:
             elif isinstance(payload, str):
                 text = payload
 
+        # Nothing to relay (telemetry, position, ...): skip the linkage search entirely
+        if not text:
+            logger.debug("Ignoring empty packet %s (Port=%s)", packet_id, portnum)
+            return
+
+        # Further copies of an already relayed packet (other gateways/sources) only add
+        # reception stats, so skip the linkage search and reaction heuristics for them.
+        # Copies of a packet still being relayed take the normal path and wait below.
+        known = self.message_state.get(packet_id)
+        if known is not None and packet_id not in self._in_flight:
+            logger.debug("Packet %s already relayed, recording reception via %s", packet_id, reception_stats.gateway_id)
+            self.message_state.move_to_end(packet_id)
+            await self._handle_duplicate_message(known, reception_stats)
+            return
+
         # Broad search for reply/request linkage ID
         reply_id = 0
         search_objs = [decoded, packet]
@@ -94,7 +260,7 @@ class MeshtasticMatrixBridge:
                     try:
                         v_int = int(v)
                         if v_int != 0 and v_int in self.message_state and v_int != packet_id:
-                            logger.info(f"Deep Linkage Search found match: field '{k}' contains known packet ID {v_int}")
+                            logger.info("Deep Linkage Search found match: field '%s' contains known packet ID %s", k, v_int)
                             reply_id = v_int
                             break
                     except (ValueError, TypeError):
@@ -104,30 +270,28 @@ class MeshtasticMatrixBridge:
         channel = str(packet.get("channel", 0))
         channel_name = packet.get("channel_name", "Unknown")
         
-        logger.info(f"Processing Packet {packet_id} from {sender} on channel {channel} ({channel_name}). Port={portnum}, Text='{text}', Found ReplyID={reply_id}")
-        if reply_id == 0 and len(text) > 0 and (len(text) < 12 or portnum == 68):
+        logger.info("Processing Packet %s from %s on channel %s (%s). Port=%s, Text='%s', Found ReplyID=%s",
+                    packet_id, sender, channel, channel_name, portnum, text, reply_id)
+        if (reply_id == 0 and len(text) > 0 and (len(text) < 12 or portnum == 68)
+                and logger.isEnabledFor(logging.DEBUG)):
             # Only log full detail if it looks like a reaction but we failed to link it
-            logger.debug(f"Reaction linkage failed. Full Packet: {packet}")
+            logger.debug("Reaction linkage failed. Full Packet: %s", packet)
         
         # Filter by channel (support index strings or name strings)
         allowed_channels = config.MESHTASTIC_CHANNELS
         if channel not in allowed_channels and channel_name not in allowed_channels:
-            logger.info(f"Ignoring packet {packet_id} from channel {channel} ({channel_name}) (Allowed: {allowed_channels})")
+            logger.info("Ignoring packet %s from channel %s (%s) (Allowed: %s)", packet_id, channel, channel_name, allowed_channels)
             return
 
-        if not text:
-             logger.debug(f"Ignoring empty packet {packet_id} (Port={portnum})")
-             return
-
         # Check for "[Reaction to ID]: Emoji" pattern (legacy/bridge reactions)
-        reaction_match = re.match(r"^\[Reaction to (\d+)\]: (.+)$", text)
-        if reaction_match:
-            target_id_str, emoji = reaction_match.groups()
-            
-            my_node_id = getattr(self.meshtastic_interface, 'node_id', None)
+        reaction = _parse_reaction(text)
+        if reaction:
+            target_id_str, emoji = reaction
             
-            if my_node_id and sender == my_node_id:
-                logger.info(f"Ignoring own reaction echo for {target_id_str}")
+            # node_id is always set on the interface and updated on every (re)connect,
+            # so it is read directly rather than snapshotted at startup
+            if sender == self.meshtastic_interface.node_id:
+                logger.info("Ignoring own reaction echo for %s", target_id_str)
                 return
             
             try:
@@ -135,196 +299,200 @@ class MeshtasticMatrixBridge:
                 if not reply_id:
                     reply_id = int(target_id_str)
                     text = emoji
-                    logger.info(f"Parsed legacy text reaction from {sender} to {reply_id}: {emoji}")
+                    logger.info("Parsed legacy text reaction from %s to %s: %s", sender, reply_id, emoji)
                 else:
                     # We have a real reply_id, just use the emoji part of the text if it was formatted this way
                     text = emoji
             except ValueError:
                 pass
         
-        # HEURISTIC: Only if we still have no reply_id AND it looks like a reaction
+        # Identify if this is a reaction (emoji) or a text reply.
+        # If portnum is REACTION_APP (68), it's definitely a reaction.
         clean_text = text.strip()
-        is_emoji_candidate = len(clean_text) < 12 and not re.search(r'[a-zA-Z]', clean_text)
+        is_emoji_reaction = portnum == 68 or (len(clean_text) < 12 and not _LETTER_RE.search(clean_text))
         
-        if reply_id == 0 and (is_emoji_candidate or portnum == 68) and self.last_packet_id and self.last_packet_id != packet_id:
-            logger.info(f"Heuristic: Treating orphan '{clean_text}' (Port={portnum}) as reaction to last packet {self.last_packet_id}")
+        # HEURISTIC: Only if we still have no reply_id AND it looks like a reaction
+        if reply_id == 0 and is_emoji_reaction and self.last_packet_id and self.last_packet_id != packet_id:
+            logger.info("Heuristic: Treating orphan '%s' (Port=%s) as reaction to last packet %s", clean_text, portnum, self.last_packet_id)
             reply_id = self.last_packet_id
 
-        # Check race condition / pending processing
-        if packet_id in self.processing_packets:
-            logger.info(f"Packet {packet_id} is currently processing, waiting...")
-            await self.processing_packets[packet_id].wait()
-
-        # Check if we already have this packet (Duplicate detection from multiple gateways/sources)
-        if packet_id in self.message_state:
-            await self._handle_duplicate_message(packet_id, reception_stats)
-        elif reply_id and reply_id in self.message_state:
-            # New message, but it is a reply to something we know
-            await self._handle_reply_message(packet_id, sender, text, reply_id, reception_stats, portnum)
+        # Check race condition / pending processing: the same packet may arrive
+        # from MQTT and LAN while the first copy is still being relayed
+        if packet_id in self._in_flight:
+            logger.info("Packet %s is currently processing, waiting...", packet_id)
+            async with self._in_flight_cv:
+                await self._in_flight_cv.wait_for(lambda: packet_id not in self._in_flight)
+                self._in_flight.add(packet_id)
         else:
-            # Brand new top-level message
-            await self._handle_new_message(packet_id, sender, text, reception_stats)
+            self._in_flight.add(packet_id)
+
+        try:
+            # Check if we already have this packet (Duplicate detection from multiple gateways/sources)
+            state = self.message_state.get(packet_id)
+            original_state = self.message_state.get(reply_id) if reply_id else None
+            if state is not None:
+                self.message_state.move_to_end(packet_id)
+                await self._handle_duplicate_message(state, reception_stats)
+            elif original_state is not None:
+                # New message, but it is a reply to something we know
+                self.message_state.move_to_end(reply_id)
+                await self._handle_reply_message(packet_id, sender, text, original_state, reception_stats,
+                                                clean_text, is_emoji_reaction)
+            else:
+                # Brand new top-level message
+                await self._handle_new_message(packet_id, sender, text, reception_stats)
+        finally:
+            self._in_flight.discard(packet_id)
+            async with self._in_flight_cv:
+                self._in_flight_cv.notify_all()
 
     async def _handle_new_message(self, packet_id: int, sender: str, text: str, stats: ReceptionStats):
         # Update last_packet_id for context
         self.last_packet_id = packet_id
+
+        # Resolve sender name from database
+        sender_name = self._node_name(sender)
+        
+        # Format stats
+        stats_str, stats_html = self._format_stats([stats])
         
-        # Mark as processing
-        event = asyncio.Event()
-        self.processing_packets[packet_id] = event
+        full_msg = f"[{sender_name}]: {text}\n{stats_str}"
+        formatted_msg = f"<b>[{_escape_html(sender_name)}]</b>: {_escape_html(text)}<br>{stats_html}"
 
-        try:
-            # Resolve sender name from database
-            sender_name = self.node_db.get_node_name(sender)
+        matrix_event_id = await self.matrix_bot.send_message(full_msg, formatted_msg)
+        
+        if matrix_event_id:
+            logger.info("Relayed %s to Matrix as %s", packet_id, matrix_event_id)
+            state = MessageState(
+                packet_id=packet_id,
+                matrix_event_id=matrix_event_id,
+                original_text=text,
+                sender=sender,
+                reception_list=[stats]
+            )
+            state.rendered_hash = hash((full_msg, formatted_msg))
+            self._remember_state(state)
+            self.event_to_packet[matrix_event_id] = packet_id
+            self._persist(state)
+    
+    async def _handle_reply_message(self, packet_id: int, sender: str, text: str, original_state: MessageState,
+                                    stats: ReceptionStats, clean_text: str, is_emoji_reaction: bool):
+        """Handle a message that is a reply to another (known) message.
+
+        original_state, clean_text and is_emoji_reaction are resolved once by handle_meshtastic_message.
+        """
+        reply_id = original_state.packet_id
+        
+        sender_name = self._node_name(sender)
+        
+        logger.debug("Reply Analysis: text='%s', is_emoji_reaction=%s", clean_text, is_emoji_reaction)
+
+        if is_emoji_reaction:
+             # Logic for "Edit Original" (Appended Text)
+             # New Logic: Create a MessageState for the reply to support de-duplication/aggregation
+            reply_state = MessageState(
+                packet_id=packet_id,
+                matrix_event_id=None,
+                original_text=clean_text,
+                sender=sender,
+                reception_list=[stats],
+                parent_packet_id=reply_id,
+                last_update=time.time()
+            )
+            self._remember_state(reply_state)
+            self._persist(reply_state)
+
+            # Check if we already have this packet_id in replies (shouldn't happen for new, but for safety)
+            if packet_id not in original_state.replies:
+                original_state.replies.append(packet_id)
             
-            # Format stats
-            stats_str = self._format_stats([stats])
-            stats_html = self._format_stats_html([stats])
+            # Update the Matrix message to include the reply (edit)
+            await self._update_matrix_message(original_state)
+            self._persist(original_state)
+            logger.info("Added reaction %s to %s", packet_id, reply_id)
+
+        else:
+            # Logic for "True Reply" (New Matrix Message)
+            stats_str, stats_html = self._format_stats([stats])
             
-            full_msg = f"[{sender_name}]: {text}\n{stats_str}"
-            formatted_msg = f"<b>[{sender_name}]</b>: {text}<br>{stats_html}"
+            # Construct Reply Fallback (Quoting)
+            quote_text, quote_html = self._build_quote(original_state)
 
-            matrix_event_id = await self.matrix_bot.send_message(full_msg, formatted_msg)
+            full_msg = f"{quote_text}[{sender_name}]: {text}\n{stats_str}"
+            formatted_msg = f"{quote_html}<b>[{_escape_html(sender_name)}]</b>: {_escape_html(text)}<br>{stats_html}"
+            
+            matrix_event_id = await self.matrix_bot.send_message(full_msg, formatted_msg, reply_to=original_state.matrix_event_id)
             
             if matrix_event_id:
-                logger.info(f"Relayed {packet_id} to Matrix as {matrix_event_id}")
-                state = MessageState(
+                 state = MessageState(
                     packet_id=packet_id,
                     matrix_event_id=matrix_event_id,
                     original_text=text,
                     sender=sender,
-                    reception_list=[stats]
-                )
-                self.message_state[packet_id] = state
-                self.node_db.save_message_state(state)
-        finally:
-            # Clear processing state
-            if packet_id in self.processing_packets:
-                del self.processing_packets[packet_id]
-            event.set()
-    
-    async def _handle_reply_message(self, packet_id: int, sender: str, text: str, reply_id: int, stats: ReceptionStats, portnum: Optional[int] = None):
-        """Handle a message that is a reply to another message."""
-        # Mark as processing (even repliers might get duplicated from LAN/MQTT)
-        event = asyncio.Event()
-        self.processing_packets[packet_id] = event
-
-        try:
-            original_state = self.message_state.get(reply_id)
-            if not original_state:
-                # Original message not found, treat as new message
-                await self._handle_new_message(packet_id, sender, text, stats)
-                return
-            
-            sender_name = self.node_db.get_node_name(sender)
-            
-            # Identify if this is a reaction (emoji) or a text reply.
-            # If portnum is REACTION_APP (68), it's definitely a reaction.
-            # Otherwise use heuristic.
-            clean_text = text.strip()
-            
-            is_reaction_port = (portnum == 68)
-            is_emoji_candidate = len(clean_text) < 12 and not re.search(r'[a-zA-Z]', clean_text)
-            
-            is_emoji_reaction = is_reaction_port or is_emoji_candidate
-            
-            logger.debug(f"Reply Analysis: text='{clean_text}', port={portnum}, is_emoji_reaction={is_emoji_reaction}")
-
-            if is_emoji_reaction:
-                 # Logic for "Edit Original" (Appended Text)
-                 # New Logic: Create a MessageState for the reply to support de-duplication/aggregation
-                reply_state = MessageState(
-                    packet_id=packet_id,
-                    matrix_event_id=None,
-                    original_text=clean_text,
-                    sender=sender,
                     reception_list=[stats],
-                    parent_packet_id=reply_id,
-                    last_update=time.time()
+                    parent_packet_id=reply_id
                 )
-                self.message_state[packet_id] = reply_state
-                self.node_db.save_message_state(reply_state)
+                 self._remember_state(state)
+                 self.event_to_packet[matrix_event_id] = packet_id
+                 self._persist(state)
 
-                if not hasattr(original_state, 'replies'):
-                    original_state.replies = []
-                
-                # Check if we already have this packet_id in replies (shouldn't happen for new, but for safety)
-                if packet_id not in original_state.replies:
-                    original_state.replies.append(packet_id)
-                
-                # Update the Matrix message to include the reply (edit)
-                await self._update_matrix_message(original_state)
-                self.node_db.save_message_state(original_state)
-                logger.info(f"Added reaction {packet_id} to {reply_id}")
-
-            else:
-                # Logic for "True Reply" (New Matrix Message)
-                stats_str = self._format_stats([stats])
-                stats_html = self._format_stats_html([stats])
-                
-                # Construct Reply Fallback (Quoting)
-                # Text fallback
-                original_sender_name = self.node_db.get_node_name(original_state.sender)
-                original_short = (original_state.original_text[:50] + '...') if len(original_state.original_text) > 50 else original_state.original_text
-                
-                quote_text = f" > <{original_sender_name}> {original_short}\n\n"
-                
-                # HTML fallback
-                room_id = self.matrix_bot.room_id
-                orig_evt_id = original_state.matrix_event_id
-                # Note: valid link format helps clients jump
-                quote_link = f'<a href="https://matrix.to/#/{room_id}/{orig_evt_id}">In reply to</a>'
-                quote_user = f'<a href="https://matrix.to/#/{original_sender_name}">{original_sender_name}</a>'
-                quote_html = f'<mx-reply><blockquote>{quote_link} {quote_user}<br>{original_short}</blockquote></mx-reply>'
-
-                full_msg = f"{quote_text}[{sender_name}]: {text}\n{stats_str}"
-                formatted_msg = f"{quote_html}<b>[{sender_name}]</b>: {text}<br>{stats_html}"
-                
-                matrix_event_id = await self.matrix_bot.send_message(full_msg, formatted_msg, reply_to=original_state.matrix_event_id)
-                
-                if matrix_event_id:
-                     state = MessageState(
-                        packet_id=packet_id,
-                        matrix_event_id=matrix_event_id,
-                        original_text=text,
-                        sender=sender,
-                        reception_list=[stats],
-                        parent_packet_id=reply_id
-                    )
-                     self.message_state[packet_id] = state
-                     self.node_db.save_message_state(state)
-
-        finally:
-            if packet_id in self.processing_packets:
-                del self.processing_packets[packet_id]
-            event.set()
-
-    async def _handle_duplicate_message(self, packet_id: int, new_stats: ReceptionStats):
-        state = self.message_state[packet_id]
-        if any(s.gateway_id == new_stats.gateway_id for s in state.reception_list):
+    async def _handle_duplicate_message(self, state: MessageState, new_stats: ReceptionStats):
+        if new_stats.gateway_id in state.gateway_ids:
             return 
 
-        state.reception_list.append(new_stats)
+        state.gateway_ids.add(new_stats.gateway_id)
+        # reception_list is kept sorted by RSSI (descending)
+        bisect.insort(state.reception_list, new_stats, key=_rssi_desc)
         state.last_update = time.time()
-        self.node_db.save_message_state(state)
+        self._persist(state)
         
         # If this message is a reaction (has parent but NO matrix_event_id), update parent.
         # Otherwise, update this message itself.
         if state.parent_packet_id and not state.matrix_event_id:
             parent_state = self.message_state.get(state.parent_packet_id)
             if parent_state:
-                await self._update_matrix_message(parent_state)
+                self._schedule_update(parent_state)
             else:
-                logger.warning(f"Parent state {state.parent_packet_id} not found for reaction {packet_id}")
+                logger.warning("Parent state %s not found for reaction %s", state.parent_packet_id, state.packet_id)
         else:
+            self._schedule_update(state)
+
+    def _schedule_update(self, state: MessageState):
+        """Schedule a trailing-edge Matrix update for a message.
+
+        Gateways tend to report the same packet within a short window, so the
+        timer is restarted on every report and only the last one edits Matrix.
+        """
+        handle = self._pending_edits.pop(state.packet_id, None)
+        if handle:
+            handle.cancel()
+        self._pending_edits[state.packet_id] = asyncio.get_running_loop().call_later(
+            config.MATRIX_EDIT_DEBOUNCE, self._start_flush_edit, state.packet_id
+        )
+
+    def _start_flush_edit(self, packet_id: int):
+        self._pending_edits.pop(packet_id, None)
+        task = asyncio.create_task(self._flush_edit(packet_id))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _flush_edit(self, packet_id: int):
+        state = self.message_state.get(packet_id)
+        if not state:
+            return
+        try:
             await self._update_matrix_message(state)
+        except Exception as e:
+            logger.error("Failed to update Matrix message for %s: %s", packet_id, e)
+
+    async def _flush_pending_edits(self):
+        """Run all debounced Matrix updates immediately (e.g. on shutdown)."""
+        for packet_id in list(self._pending_edits):
+            self._pending_edits.pop(packet_id).cancel()
+            await self._flush_edit(packet_id)
 
     async def _update_matrix_message(self, state: MessageState):
-        # Resolve sender name from database
-        sender_name = self.node_db.get_node_name(state.sender)
-        
-        stats_str = self._format_stats(state.reception_list)
-        stats_html = self._format_stats_html(state.reception_list)
+        stats_str, stats_html = self._state_stats(state)
         
         # Reconstruct Quote if it's a True Reply
         quote_text = ""
@@ -332,43 +500,16 @@ class MeshtasticMatrixBridge:
         if state.parent_packet_id and state.matrix_event_id:
             parent_state = self.message_state.get(state.parent_packet_id)
             if parent_state:
-                parent_sender_name = self.node_db.get_node_name(parent_state.sender)
-                parent_short = (parent_state.original_text[:50] + '...') if len(parent_state.original_text) > 50 else parent_state.original_text
-                
-                quote_text = f"> <{parent_sender_name}> {parent_short}\n\n"
-                
-                room_id = self.matrix_bot.room_id
-                orig_evt_id = parent_state.matrix_event_id
-                quote_link = f'<a href="https://matrix.to/#/{room_id}/{orig_evt_id}">In reply to</a>'
-                quote_user = f'<a href="https://matrix.to/#/{parent_sender_name}">{parent_sender_name}</a>'
-                quote_html = f'<mx-reply><blockquote>{quote_link} {quote_user}<br>{parent_short}</blockquote></mx-reply>'
+                quote_text, quote_html = self._build_quote(parent_state)
 
         # Prepare Replies (Reactions attached to this message)
         reply_block = ""
         reply_block_html = ""
-        if hasattr(state, 'replies') and state.replies:
-            reply_lines = []
-            reply_lines_html = []
-            
-            for reply_item in state.replies:
-                if isinstance(reply_item, int):
-                    # It's a Packet ID pointing to a Reaction State
-                    r_state = self.message_state.get(reply_item)
-                    if r_state:
-                        r_sender = self.node_db.get_node_name(r_state.sender)
-                        r_stats = self._format_stats(r_state.reception_list)
-                        r_stats_html = self._format_stats_html(r_state.reception_list)
-                        # "  ↳ [Sender]: Text (Stats)"
-                        reply_lines.append(f"  ↳ [{r_sender}]: {r_state.original_text} {r_stats}")
-                        reply_lines_html.append(f"&nbsp;&nbsp;↳ [{r_sender}]: {r_state.original_text} {r_stats_html}")
-                else:
-                    # Legacy String
-                    reply_lines.append(str(reply_item))
-                    reply_lines_html.append(str(reply_item).replace('<','&lt;'))
-
-            if reply_lines:
-                reply_block = "\n" + "\n".join(reply_lines)
-                reply_block_html = "<br>" + "<br>".join(reply_lines_html)
+        if state.replies:
+            lines = [line for line in map(self._render_reply, state.replies) if line]
+            if lines:
+                reply_block = "\n" + "\n".join([text for text, _ in lines])
+                reply_block_html = "<br>" + "<br>".join([html_line for _, html_line in lines])
 
         # Render Logic
         if state.render_only_stats:
@@ -387,46 +528,112 @@ class MeshtasticMatrixBridge:
                 event_id = await self.matrix_bot.send_message(new_content, new_html)
                 if event_id:
                     state.matrix_event_id = event_id
-                    self.node_db.save_message_state(state)
+                    state.rendered_hash = hash((new_content, new_html))
+                    self.event_to_packet[event_id] = state.packet_id
+                    self._persist(state)
             else:
                 # Edit existing stats message
-                await self.matrix_bot.edit_message(state.matrix_event_id, new_content, new_html)
+                await self._edit_if_changed(state, new_content, new_html)
 
         else:
             # Standard Mode: Full message relay
-            new_content = f"{quote_text}[{sender_name}]: {state.original_text}\n{stats_str}{reply_block}"
-            new_html = f"{quote_html}<b>[{sender_name}]</b>: {state.original_text}<br>{stats_html}{reply_block_html}"
+            prefix_text, prefix_html = self._message_prefix(state)
+            new_content = quote_text + prefix_text + stats_str + reply_block
+            new_html = quote_html + prefix_html + stats_html + reply_block_html
             
             if state.matrix_event_id:
-                await self.matrix_bot.edit_message(state.matrix_event_id, new_content, new_html)
+                await self._edit_if_changed(state, new_content, new_html)
+
+    async def _edit_if_changed(self, state: MessageState, new_content: str, new_html: str):
+        """Edit the Matrix message of a state unless it already shows this content."""
+        rendered_hash = hash((new_content, new_html))
+        if rendered_hash == state.rendered_hash:
+            logger.debug("Skipping unchanged edit for %s", state.packet_id)
+            return
+        await self.matrix_bot.edit_message(state.matrix_event_id, new_content, new_html)
+        state.rendered_hash = rendered_hash
     
+    def _build_quote(self, parent_state: MessageState) -> Tuple[str, str]:
+        """Build the Matrix reply fallback quoting a parent message, as (text, html)."""
+        name = self._node_name(parent_state.sender)
+        short = parent_state.short_text
+        if short is None:
+            short = parent_state.short_text = _shorten(parent_state.original_text)
+        name_html = _escape_html(name)
+        # Note: valid link format helps clients jump
+        quote_html = (
+            f'{_MX_REPLY_OPEN}<a href="{_MATRIX_TO}{self.matrix_bot.room_id}/{parent_state.matrix_event_id}">In reply to</a> '
+            f'<a href="{_MATRIX_TO}{name_html}">{name_html}</a><br>{_escape_html(short)}{_MX_REPLY_CLOSE}'
+        )
+        return f"> <{name}> {short}\n\n", quote_html
+
+    def _message_prefix(self, state: MessageState) -> Tuple[str, str]:
+        """Return the invariant "[Sender]: text" header of a message as (text, html)."""
+        sender_name = self._node_name(state.sender)
+        prefix = state.rendered_prefix
+        if prefix is None or prefix[0] != sender_name:
+            prefix = state.rendered_prefix = (
+                sender_name,
+                f"[{sender_name}]: {state.original_text}\n",
+                f"<b>[{_escape_html(sender_name)}]</b>: {_escape_html(state.original_text)}<br>",
+            )
+        return prefix[1], prefix[2]
+
+    def _render_reply(self, reply_item: Union[int, str]) -> Optional[Tuple[str, str]]:
+        """Render one entry of MessageState.replies as (text, html) lines."""
+        if isinstance(reply_item, int):
+            # It's a Packet ID pointing to a Reaction State
+            r_state = self.message_state.get(reply_item)
+            if not r_state:
+                return None
+            r_sender = self._node_name(r_state.sender)
+            r_stats, r_stats_html = self._state_stats(r_state)
+            # "  ↳ [Sender]: Text (Stats)"
+            return (f"  ↳ [{r_sender}]: {r_state.original_text} {r_stats}",
+                    f"&nbsp;&nbsp;↳ [{_escape_html(r_sender)}]: {_escape_html(r_state.original_text)} {r_stats_html}")
+        # Legacy String
+        legacy = str(reply_item)
+        return legacy, _escape_html(legacy)
+
     async def _update_message_with_replies(self, state: MessageState):
         """Update a Matrix message to include replies."""
         await self._update_matrix_message(state)
     
-    def _format_stats(self, stats_list: List[ReceptionStats]) -> str:
-        """Format reception statistics (Text)."""
-        sorted_stats = sorted(stats_list, key=lambda x: x.rssi, reverse=True)
+    def _node_name(self, node_id: str) -> str:
+        """Resolve a node ID to its name; unknown nodes show as their ID."""
+        return self._name_cache.get(node_id, node_id)
+
+    def _state_stats(self, state: MessageState) -> Tuple[str, str]:
+        """Format a message's reception stats, reusing the last rendering if nothing changed.
+
+        reception_list only ever grows, so its length plus the names version
+        identifies the rendered content.
+        """
+        key = (len(state.reception_list), self._names_version)
+        cached = state.rendered_stats
+        if cached is not None and cached[:2] == key:
+            return cached[2], cached[3]
+        stats_str, stats_html = self._format_stats(state.reception_list)
+        state.rendered_stats = (*key, stats_str, stats_html)
+        return stats_str, stats_html
+
+    def _format_stats(self, sorted_stats: List[ReceptionStats]) -> Tuple[str, str]:
+        """Format reception statistics as (text, html). Expects a list sorted by RSSI.
+
+        Both variants share the same gateway list, so it is built only once.
+        """
         if not sorted_stats:
-            return ""
-        return f"*({self._build_stats_str(sorted_stats)})*"
-
-    def _format_stats_html(self, stats_list: List[ReceptionStats]) -> str:
-        """Format reception statistics (HTML)."""
-        sorted_stats = sorted(stats_list, key=lambda x: x.rssi, reverse=True)
-        if not sorted_stats:
-             return ""
-        return f"<small>({self._build_stats_str(sorted_stats)})</small>"
-
-    def _build_stats_str(self, sorted_stats) -> str:
-        gateway_strings = []
-        for s in sorted_stats:
-            gateway_name = self.node_db.get_node_name(s.gateway_id)
-            if s.hop_count == 0:
-                gateway_strings.append(f"{gateway_name} ({s.rssi}dBm/{s.snr}dB)")
-            else:
-                gateway_strings.append(f"{gateway_name} ({s.hop_count} hops)")
-        return ', '.join(gateway_strings)
+            return "", ""
+        stats_str = self._build_stats_str(sorted_stats)
+        return f"*({stats_str})*", f"<small>({_escape_html(stats_str)})</small>"
+
+    def _build_stats_str(self, sorted_stats: List[ReceptionStats]) -> str:
+        name = self._node_name
+        return ', '.join([
+            f"{name(s.gateway_id)} ({s.rssi}dBm/{s.snr}dB)" if s.hop_count == 0
+            else f"{name(s.gateway_id)} ({s.hop_count} hops)"
+            for s in sorted_stats
+        ])
 
     async def handle_matrix_message(self, event):
         # Get the display name for the sender
@@ -442,14 +649,12 @@ class MeshtasticMatrixBridge:
             parts = content.split("\n\n", 1)
             if len(parts) > 1 and parts[0].startswith(">"):
                 content = parts[1]
-                logger.debug(f"Stripped Matrix reply fallback. Clean text: {content}")
+                logger.debug("Stripped Matrix reply fallback. Clean text: %s", content)
             
             # Try to resolve target Mesh packet ID
-            for pid, state in self.message_state.items():
-                if state.matrix_event_id == reply_to_event_id:
-                    target_packet_id = pid
-                    logger.info(f"Matrix message is a reply to Mesh packet {target_packet_id}")
-                    break
+            target_packet_id = self.event_to_packet.get(reply_to_event_id)
+            if target_packet_id:
+                logger.info("Matrix message is a reply to Mesh packet %s", target_packet_id)
 
         full_message = f"[{sender_name}]: {content}"
         
@@ -458,46 +663,52 @@ class MeshtasticMatrixBridge:
         encoded = full_message.encode('utf-8')
         
         if len(encoded) > max_len:
-            # Splitting case
-            parts = []
-            while encoded:
-                parts.append(encoded[:max_len])
-                encoded = encoded[max_len:]
-                
-            for i, part in enumerate(parts):
-                text_part = part.decode('utf-8', errors='ignore')
-                prefix = f"({i+1}/{len(parts)}) "
-                # We only attach replyId to the first part to avoid mesh confusion
-                part_reply_id = target_packet_id if i == 0 else None
-                self.meshtastic_interface.send_text(f"{prefix}{text_part}", 
-                                                   channel_idx=config.MESHTASTIC_CHANNEL_IDX,
-                                                   reply_id=part_reply_id)
-                await asyncio.sleep(0.5)
+            parts = _split_utf8(encoded, max_len)
+            total = len(parts)
+            messages = [f"({i}/{total}) {part}" for i, part in enumerate(parts, 1)]
+
+            # The interface paces the parts and only attaches replyId to the first one
+            await self.meshtastic_interface.send_text_batch(messages,
+                                                            channel_idx=config.MESHTASTIC_CHANNEL_IDX,
+                                                            reply_id=target_packet_id)
         else:
-             packet = self.meshtastic_interface.send_text(full_message, 
-                                                        channel_idx=config.MESHTASTIC_CHANNEL_IDX,
-                                                        reply_id=target_packet_id)
-             
-             # Normal case - Track this!
-             if packet and hasattr(packet, 'id'):
-                 packet_id = packet.id
-                 logger.info(f"Tracking Matrix-originated message {packet_id}")
-                 
-                 state = MessageState(
-                     packet_id=packet_id,
-                     matrix_event_id=None, # Will be set when stats arrive
-                     original_text=content, # User text
-                     sender=event.sender, # Matrix ID
-                     render_only_stats=True,
-                     related_event_id=event.event_id
-                 )
-                 self.message_state[packet_id] = state
-                 self.node_db.save_message_state(state)
+             # Queued behind any split message still going out, so parts never interleave.
+             # The handler doesn't wait for the send; the packet is tracked once it's out
+             sent = await self.meshtastic_interface.send_queued_text(full_message,
+                                                                     channel_idx=config.MESHTASTIC_CHANNEL_IDX,
+                                                                     reply_id=target_packet_id)
+             sent.add_done_callback(functools.partial(self._track_sent_message, content, event))
+
+    def _track_sent_message(self, content: str, event, sent: asyncio.Future):
+        """Start tracking a Matrix-originated message once the mesh send completes."""
+        if sent.cancelled():
+            return
+        if sent.exception() is not None:
+            logger.error("Failed to send Matrix message %s to mesh: %s", event.event_id, sent.exception())
+            return
+        packet = sent.result()
+        if packet and hasattr(packet, 'id'):
+            packet_id = packet.id
+            logger.info("Tracking Matrix-originated message %s", packet_id)
+            
+            state = MessageState(
+                packet_id=packet_id,
+                matrix_event_id=None, # Will be set when stats arrive
+                original_text=content, # User text
+                sender=event.sender, # Matrix ID
+                render_only_stats=True,
+                related_event_id=event.event_id
+            )
+            self._remember_state(state)
+            self._persist(state)
     
     async def handle_node_info(self, node_id: str, short_name: Optional[str] = None, long_name: Optional[str] = None):
         """Handle NODEINFO packets to update the node database."""
-        self.node_db.update_node(node_id, short_name, long_name)
-        logger.info(f"Updated node info for {node_id}: {short_name or long_name}")
+        # The write happens on the database writer thread; only the resulting name comes back
+        name = await asyncio.wrap_future(self.node_db.queue_node_update(node_id, short_name, long_name))
+        self._name_cache[node_id] = name
+        self._names_version += 1
+        logger.info("Updated node info for %s: %s", node_id, short_name or long_name)
 
     async def handle_matrix_reaction(self, event):
         # In matrix-nio, the event object handles content differently depending on event type.
@@ -510,12 +721,7 @@ class MeshtasticMatrixBridge:
         if not event_id or not key:
             return
 
-        target_packet_id = None
-        for pid, state in self.message_state.items():
-            if state.matrix_event_id == event_id:
-                target_packet_id = pid
-                break
-        
+        target_packet_id = self.event_to_packet.get(event_id)
         if target_packet_id:
-            logger.info(f"Forwarding reaction {key} to mesh for packet {target_packet_id}")
-            self.meshtastic_interface.send_tapback(target_packet_id, key, channel_idx=config.MESHTASTIC_CHANNEL_IDX)
+            logger.info("Forwarding reaction %s to mesh for packet %s", key, target_packet_id)
+            await self.meshtastic_interface.send_tapback(target_packet_id, key, channel_idx=config.MESHTASTIC_CHANNEL_IDX)
@@ -8,6 +8,8 @@ MATRIX_HOMESERVER = os.getenv("MATRIX_HOMESERVER")
 MATRIX_USER = os.getenv("MATRIX_USER")
 MATRIX_PASSWORD = os.getenv("MATRIX_PASSWORD")
 MATRIX_ROOM_ID = os.getenv("MATRIX_ROOM_ID")
+# Seconds to wait for more gateway reports before editing a Matrix message
+MATRIX_EDIT_DEBOUNCE = float(os.getenv("MATRIX_EDIT_DEBOUNCE", 0.5))
 
 # MQTT
 MQTT_BROKER = os.getenv("MQTT_BROKER")
@@ -26,3 +28,5 @@ MESHTASTIC_CHANNELS = [x.strip() for x in os.getenv("MESHTASTIC_CHANNELS", "0").
 
 # Database
 NODE_DB_PATH = os.getenv("NODE_DB_PATH", "/data/nodes.db")
+# Maximum number of messages kept in memory for deduplication, replies and reactions
+MESSAGE_STATE_LIMIT = int(os.getenv("MESSAGE_STATE_LIMIT", 10000))
@@ -1,16 +1,42 @@
 import asyncio
 import logging
-from typing import Optional, Callable
-from nio import AsyncClient, MatrixRoom, RoomMessageText, RoomMessageNotice, Event, ReactionEvent
+import sys
+import time
+from typing import Any, Dict, List, Optional, Callable, Tuple, Union
+from nio import (AsyncClient, MatrixRoom, RoomMessageText, RoomMessageNotice, Event, ReactionEvent,
+                 LoginError, ProfileGetDisplayNameResponse, RoomResolveAliasResponse, RoomSendResponse,
+                 UploadFilterResponse)
 import config
 
 logger = logging.getLogger(__name__)
 
+# Seconds a resolved display name is reused before asking again
+DISPLAY_NAME_TTL = 300
+
+# Sync only what the bridge uses: no presence, members loaded lazily
+# alongside the events that need them, and a short timeline window
+SYNC_FILTER_ROOM = {"state": {"lazy_load_members": True}, "timeline": {"limit": 10}}
+SYNC_FILTER_PRESENCE = {"types": []}
+
+# Copied for every outgoing text event
+_TEXT_TEMPLATE = {"msgtype": "m.text"}
+
 class MatrixBot:
     def __init__(self, bridge):
         self.bridge = bridge
         self.client = AsyncClient(config.MATRIX_HOMESERVER, config.MATRIX_USER)
         self.room_id = config.MATRIX_ROOM_ID
+        # User ID -> (resolved at, display name)
+        self._display_names: Dict[str, Tuple[float, str]] = {}
+        # User ID -> lookup in progress, so concurrent callers share one request
+        self._display_name_lookups: Dict[str, asyncio.Task] = {}
+        # Outgoing events as (content, keeps timeline order, future for the response)
+        self._send_queue: "asyncio.Queue[Tuple[Dict[str, Any], bool, asyncio.Future]]" = asyncio.Queue()
+        self._send_task: Optional[asyncio.Task] = None
+        # Our own user ID, fixed once logged in; checked against every synced event
+        self._own_user_id: Optional[str] = None
+        # Filter ID uploaded at start-up (or the filter itself if the upload failed)
+        self._sync_filter: Optional[Union[str, Dict[str, Any]]] = None
 
     async def start(self):
         logger.info(f"Connecting to Matrix as {config.MATRIX_USER}...")
@@ -24,7 +50,7 @@ class MatrixBot:
             resp = await self.client.login(config.MATRIX_PASSWORD)
             
             logger.info(f"DEBUG: Login response type: {type(resp)}")
-            if hasattr(resp, 'error'):
+            if isinstance(resp, LoginError):
                  logger.error(f"Matrix Login failed: {resp}")
                  return
 
@@ -32,40 +58,142 @@ class MatrixBot:
         if self.room_id.startswith("#"):
             logger.info(f"Resolving room alias {self.room_id}...")
             resp = await self.client.room_resolve_alias(self.room_id)
-            if hasattr(resp, 'room_id'):
+            if isinstance(resp, RoomResolveAliasResponse):
                 self.room_id = resp.room_id
                 logger.info(f"Resolved to {self.room_id}")
             else:
                 logger.error(f"Could not resolve room alias: {resp}")
                 return
 
+        # Interned so the per-event room and sender checks can usually
+        # short-circuit on identity
+        self.room_id = sys.intern(self.room_id)
+        self._own_user_id = sys.intern(self.client.user_id)
+
+        self._sync_filter = await self._upload_sync_filter()
+
         logger.info(f"Logged in. Initial synchronization...")
-        await self.client.sync(timeout=30000, full_state=True) # Initial sync
+        await self.client.sync(timeout=30000, sync_filter=self._sync_filter) # Initial sync
 
         self.client.add_event_callback(self._on_room_message, RoomMessageText)
         self.client.add_event_callback(self._on_reaction, ReactionEvent)
 
         logger.info("Matrix Bot listening...")
+        self._send_task = asyncio.create_task(self._send_loop())
         # Start sync loop in background
         asyncio.create_task(self._sync_loop())
 
     async def _sync_loop(self):
         try:
-            await self.client.sync_forever(timeout=30000)
+            await self.client.sync_forever(timeout=30000, sync_filter=self._sync_filter)
         except Exception as e:
             logger.error(f"Matrix sync error: {e}")
 
+    async def _upload_sync_filter(self) -> Union[str, Dict[str, Any]]:
+        resp = await self.client.upload_filter(presence=SYNC_FILTER_PRESENCE, room=SYNC_FILTER_ROOM)
+        if isinstance(resp, UploadFilterResponse):
+            return resp.filter_id
+        logger.warning(f"Could not upload sync filter, sending it inline: {resp}")
+        return {"room": SYNC_FILTER_ROOM, "presence": SYNC_FILTER_PRESENCE}
+
     async def stop(self):
+        if self._send_task:
+            send_task, self._send_task = self._send_task, None
+            send_task.cancel()
+            # Let it cancel the rest of the batch it was sending
+            await asyncio.gather(send_task, return_exceptions=True)
+            # Don't leave callers waiting on events that will never be sent
+            while not self._send_queue.empty():
+                self._send_queue.get_nowait()[2].cancel()
         await self.client.close()
 
-    async def send_message(self, text: str, html: Optional[str] = None, reply_to: Optional[str] = None) -> Optional[str]:
-        content = {
-            "msgtype": "m.text",
-            "body": text
-        }
+    async def _room_send(self, content: Dict[str, Any]):
+        return await self.client.room_send(
+            room_id=self.room_id,
+            message_type="m.room.message",
+            content=content
+        )
+
+    async def _submit(self, content: Dict[str, Any], ordered: bool):
+        """Send an event through the send queue and return the homeserver response."""
+        if self._send_task is None:
+            return await self._room_send(content)
+        future = asyncio.get_running_loop().create_future()
+        self._send_queue.put_nowait((content, ordered, future))
+        return await future
+
+    async def _send_loop(self):
+        """Send everything queued so far in one round.
+
+        New messages go out one after another so they keep their timeline order;
+        edits don't depend on each other and are sent concurrently alongside them.
+        """
+        while True:
+            batch = [await self._send_queue.get()]
+            while not self._send_queue.empty():
+                batch.append(self._send_queue.get_nowait())
+            ordered = [item for item in batch if item[1]]
+            # Several queued edits of the same event collapse into the newest one
+            edits: Dict[str, List[Tuple[Dict[str, Any], bool, asyncio.Future]]] = {}
+            for item in batch:
+                if not item[1]:
+                    edits.setdefault(item[0]["m.relates_to"]["event_id"], []).append(item)
+            try:
+                await asyncio.gather(self._send_in_order(ordered), *map(self._send_latest, edits.values()))
+            finally:
+                # Only unresolved if we were stopped mid-batch
+                for _, _, future in batch:
+                    if not future.done():
+                        future.cancel()
+
+    async def _send_in_order(self, items: List[Tuple[Dict[str, Any], bool, asyncio.Future]]):
+        for item in items:
+            await self._send_item(item)
+
+    async def _send_latest(self, items: List[Tuple[Dict[str, Any], bool, asyncio.Future]]):
+        """Send only the last of several edits; the superseded callers share its outcome."""
+        *superseded, latest = items
+        if superseded:
+            logger.debug("Coalesced %d edits of %s", len(items), latest[0]['m.relates_to']['event_id'])
+        try:
+            await self._send_item(latest)
+        finally:
+            source = latest[2]
+            for _, _, future in superseded:
+                if future.done():
+                    continue
+                if not source.done() or source.cancelled():
+                    future.cancel()
+                elif source.exception() is not None:
+                    future.set_exception(source.exception())
+                else:
+                    future.set_result(source.result())
+
+    async def _send_item(self, item: Tuple[Dict[str, Any], bool, asyncio.Future]):
+        content, _, future = item
+        try:
+            resp = await self._room_send(content)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(resp)
+
+    @staticmethod
+    def _text_content(text: str, html: Optional[str]) -> Dict[str, Any]:
+        content = _TEXT_TEMPLATE.copy()
+        content["body"] = text
         if html:
             content["format"] = "org.matrix.custom.html"
             content["formatted_body"] = html
+        return content
+
+    async def send_message(self, text: str, html: Optional[str] = None, reply_to: Optional[str] = None) -> Optional[str]:
+        content = self._text_content(text, html)
         
         if reply_to:
             content["m.relates_to"] = {
@@ -74,99 +202,98 @@ class MatrixBot:
                 }
             }
 
-        resp = await self.client.room_send(
-            room_id=self.room_id,
-            message_type="m.room.message",
-            content=content
-        )
-        if hasattr(resp, 'event_id'):
+        resp = await self._submit(content, ordered=True)
+        if isinstance(resp, RoomSendResponse):
             return resp.event_id
         logger.error(f"Failed to send Matrix message: {resp}")
         return None
 
     async def edit_message(self, event_id: str, new_text: str, new_html: Optional[str] = None):
         # Matrix edit is a new event with "m.relates_to"
-        new_content = {
-            "msgtype": "m.text",
-            "body": new_text
-        }
-        if new_html:
-            new_content["format"] = "org.matrix.custom.html"
-            new_content["formatted_body"] = new_html
-
-        content = {
-            "msgtype": "m.text",
-            "body": new_text, # Fallback
-            "m.new_content": new_content,
-            "m.relates_to": {
-                "rel_type": "m.replace",
-                "event_id": event_id
-            }
+        new_content = self._text_content(new_text, new_html)
+
+        # The outer body is the fallback for clients without edit support
+        content = new_content.copy()
+        content["m.new_content"] = new_content
+        content["m.relates_to"] = {
+            "rel_type": "m.replace",
+            "event_id": event_id
         }
-        if new_html:
-            content["format"] = "org.matrix.custom.html"
-            content["formatted_body"] = new_html # Some clients look here too? NO, usually inside m.new_content
 
-        await self.client.room_send(
-            room_id=self.room_id,
-            message_type="m.room.message",
-            content=content
-        )
+        await self._submit(content, ordered=False)
     
     async def get_display_name(self, user_id: str) -> str:
         """Get the display name for a user in the current room.
         
         Prioritizes room-specific nicknames (set via /myroomnick) over global display names.
         Falls back to the user_id if display name is not available.
+        Names are cached for DISPLAY_NAME_TTL seconds and concurrent lookups share one request.
         """
+        cached = self._display_names.get(user_id)
+        if cached and time.monotonic() - cached[0] < DISPLAY_NAME_TTL:
+            return cached[1]
+
+        lookup = self._display_name_lookups.get(user_id)
+        if lookup is None:
+            lookup = asyncio.create_task(self._fetch_display_name(user_id))
+            self._display_name_lookups[user_id] = lookup
+            lookup.add_done_callback(lambda _: self._display_name_lookups.pop(user_id, None))
+        # Shield the shared lookup so one cancelled caller doesn't cancel it for the others
+        return await asyncio.shield(lookup)
+
+    async def _fetch_display_name(self, user_id: str) -> str:
         try:
-            # First, try to get the room-specific display name from room members
-            # This includes nicknames set via /myroomnick
-            rooms_response = await self.client.joined_rooms()
-            if hasattr(rooms_response, 'rooms') and self.room_id in rooms_response.rooms:
-                # Get room members to access room-specific display names
-                # We need to check the synced room data
-                if self.room_id in self.client.rooms:
-                    room = self.client.rooms[self.room_id]
-                    # Check if user is in the room and get their display name
-                    if user_id in room.users:
-                        display_name = room.user_name(user_id)
-                        if display_name and display_name != user_id:
-                            return display_name
+            # Room-specific display names (including /myroomnick nicknames) come from
+            # the room state that the sync loop already keeps up to date
+            room = self.client.rooms.get(self.room_id)
+            if room and user_id in room.users:
+                display_name = room.user_name(user_id)
+                if display_name and display_name != user_id:
+                    return self._remember_display_name(user_id, display_name)
             
             # Fallback to global display name
             response = await self.client.get_displayname(user_id)
-            if hasattr(response, 'displayname') and response.displayname:
-                return response.displayname
+            if isinstance(response, ProfileGetDisplayNameResponse) and response.displayname:
+                return self._remember_display_name(user_id, response.displayname)
         except Exception as e:
-            logger.debug(f"Could not fetch display name for {user_id}: {e}")
+            logger.debug("Could not fetch display name for %s: %s", user_id, e)
         
         # Final fallback to user_id
-        return user_id
+        return self._remember_display_name(user_id, user_id)
+
+    def _remember_display_name(self, user_id: str, display_name: str) -> str:
+        self._display_names[user_id] = (time.monotonic(), display_name)
+        return display_name
 
     async def _on_room_message(self, room: MatrixRoom, event: RoomMessageText):
         if room.room_id != self.room_id:
             return
         
         # Ignore own messages
-        if event.sender == self.client.user_id:
+        if event.sender == self._own_user_id:
             return
 
+        # The synced room state already knows the sender's name; cache it so
+        # relaying the message doesn't need a lookup
+        display_name = room.user_name(event.sender)
+        if display_name and display_name != event.sender:
+            self._remember_display_name(event.sender, display_name)
+
         # Handle message forwarding to Mesh
-        logger.info(f"Matrix message from {event.sender}: {event.body}")
+        logger.info("Matrix message from %s: %s", event.sender, event.body)
         await self.bridge.handle_matrix_message(event)
 
     async def _on_reaction(self, room: MatrixRoom, event: ReactionEvent):
         if room.room_id != self.room_id:
             return
         
-        if event.sender == self.client.user_id:
+        if event.sender == self._own_user_id:
             return
 
         # ReactionEvent might not have .content attribute directly in some nio versions
         # Use .source['content'] for safety
         content = event.source.get('content', {})
-        logger.info(f"Matrix reaction {content} from {event.sender}")
+        logger.info("Matrix reaction %s from %s", content, event.sender)
         
         # We need to pass a unified object or modify usage in bridge. 
         # Bridge expects event object with .content
@@ -1,5 +1,7 @@
 import asyncio
-from typing import Optional
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Set
 import logging
 import meshtastic.tcp_interface
 from meshtastic import portnums_pb2
@@ -9,6 +11,23 @@ from pubsub import pub
 
 logger = logging.getLogger(__name__)
 
+# Seconds between queued outgoing packets, so the radio isn't flooded
+BATCH_SEND_INTERVAL = 0.5
+# Outgoing messages (single texts or split batches) that may wait for the sender
+# before callers are held back
+TX_QUEUE_SIZE = 64
+# Received packets waiting for the event loop; beyond this the reader thread drops them
+RX_QUEUE_SIZE = 256
+# Port the bridge uses for tapbacks. Protobuf releases name 68 differently, so
+# it is only matched by number
+REACTION_PORTNUM = 68
+
+
+@functools.lru_cache(maxsize=64)
+def _encode_emoji(emoji: str) -> bytes:
+    # Reactions reuse a handful of emoji; Matrix lets users pick any key, hence the bound
+    return emoji.encode("utf-8")
+
 class MeshtasticInterface:
     def __init__(self, bridge):
         self.bridge = bridge
@@ -16,9 +35,31 @@ class MeshtasticInterface:
         self._connect_task = None
         self._disconnect_future = None
         self.node_id = "LAN_Node"
+        self._tx_queue: asyncio.Queue = asyncio.Queue(maxsize=TX_QUEUE_SIZE)
+        self._tx_task = None
+        self._rx_queue: asyncio.Queue = asyncio.Queue(maxsize=RX_QUEUE_SIZE)
+        self._rx_task = None
+        # Loop that inbound packets are handed to from the meshtastic reader thread
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Channel index -> name, read from the node's config on connect
+        self._channel_names: Dict[int, str] = {}
+        # Strong references to dispatched handler tasks until they finish
+        self._tasks: Set[asyncio.Task] = set()
+        # Blocking meshtastic calls get their own thread instead of the loop's default
+        # executor, so a slow connect can't hold up unrelated to_thread work
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mesh-io")
+        # decoded.portnum -> packet handler. The library reports ports by enum
+        # name ("TEXT_MESSAGE_APP"), so named ports are keyed both ways
+        self._port_handlers: Dict[Any, Callable] = {REACTION_PORTNUM: self._handle_text}
+        for portnum, handler in ((portnums_pb2.NODEINFO_APP, self._handle_nodeinfo),
+                                 (portnums_pb2.TEXT_MESSAGE_APP, self._handle_text)):
+            self._port_handlers[portnum] = handler
+            self._port_handlers[portnums_pb2.PortNum.Name(portnum)] = handler
 
     def start(self):
         self._connect_task = asyncio.create_task(self._connect_loop())
+        self._tx_task = asyncio.create_task(self._tx_loop())
+        self._rx_task = asyncio.create_task(self._rx_loop())
 
     async def _connect_loop(self):
         while True:
@@ -33,11 +74,13 @@ class MeshtasticInterface:
                 logger.info(f"Connecting to Meshtastic Node at {config.MESHTASTIC_HOST}:{config.MESHTASTIC_PORT}...")
                 
                 # TCPInterface starts its own threads for reading and heartbeats
-                self.interface = await asyncio.to_thread(
+                self.interface = await self._run_io(
                     meshtastic.tcp_interface.TCPInterface,
                     hostname=config.MESHTASTIC_HOST,
                     portNumber=config.MESHTASTIC_PORT
                 )
+                self._loop = asyncio.get_running_loop()
+                self._channel_names = self._read_channel_names()
                 
                 # Subscribe to events
                 pub.subscribe(self._on_meshtastic_message, "meshtastic.receive")
@@ -45,8 +88,7 @@ class MeshtasticInterface:
                 
                 # Get Local Node ID
                 try:
-                    my_node = self.interface.myNodeInfo.myNode
-                    self.node_id = "!" + hex(my_node.id)[2:]
+                    self.node_id = f"!{self.interface.myInfo.my_node_num:08x}"
                     logger.info(f"Connected to Meshtastic Node! Local ID: {self.node_id}")
                 except Exception as e:
                     logger.warning(f"Could not get local node ID: {e}")
@@ -67,8 +109,19 @@ class MeshtasticInterface:
             self._cleanup_interface()
             await asyncio.sleep(5)
 
+    def _read_channel_names(self) -> Dict[int, str]:
+        """Channel index -> name from the local node's config; empty if it can't be read."""
+        try:
+            channels = self.interface.localNode.channels if self.interface else None
+            return {c.index: getattr(c.settings, 'name', "Unknown") for c in channels or []}
+        except Exception as e:
+            # Channel names only label packets; never let them fail a working connection
+            logger.warning("Could not read channel names: %s", e)
+            return {}
+
     def _cleanup_interface(self):
         """Safely close and clean up the current interface."""
+        self._channel_names = {}
         pub.unsubscribe(self._on_meshtastic_message, "meshtastic.receive")
         pub.unsubscribe(self._on_connection_lost, "meshtastic.connection.lost")
         
@@ -94,9 +147,26 @@ class MeshtasticInterface:
     def stop(self):
         if self._connect_task:
             self._connect_task.cancel()
+        if self._tx_task:
+            self._tx_task.cancel()
+            if not self._tx_queue.empty():
+                logger.warning(f"Dropping {self._tx_queue.qsize()} queued outgoing messages")
+            # Don't leave callers waiting on messages that will never be sent
+            while not self._tx_queue.empty():
+                future = self._tx_queue.get_nowait()[3]
+                if future:
+                    future.cancel()
+        if self._rx_task:
+            self._rx_task.cancel()
         self._cleanup_interface()
+        self._io.shutdown(wait=False, cancel_futures=True)
 
-    def send_tapback(self, target_packet_id: int, emoji: str, channel_idx: int = 0):
+    async def _run_io(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking meshtastic call on the mesh I/O thread."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._io, functools.partial(func, *args, **kwargs))
+
+    async def send_tapback(self, target_packet_id: int, emoji: str, channel_idx: int = 0):
         """
         Sends a tapback (reaction) to the mesh.
         Uses REACTION_APP (68) so clients render it properly.
@@ -106,92 +176,152 @@ class MeshtasticInterface:
             return
 
         try:
-            self.interface.sendData(
-                data=emoji.encode("utf-8"),
-                portNum=68,
+            await self._run_io(
+                self.interface.sendData,
+                data=_encode_emoji(emoji),
+                portNum=REACTION_PORTNUM,
                 replyId=target_packet_id,
                 channelIndex=channel_idx
             )
-            logger.info(f"Sent tapback '{emoji}' to {target_packet_id}")
+            logger.info("Sent tapback '%s' to %s", emoji, target_packet_id)
         except Exception as e:
             logger.error(f"Failed to send tapback: {e}")
             # If we hit a broken pipe or similar, trigger a reconnect
             if isinstance(e, BrokenPipeError) or "Broken pipe" in str(e):
                 self._on_connection_lost(self.interface)
 
-    def send_text(self, text: str, channel_idx: int = 0, reply_id: Optional[int] = None):
+    async def send_text(self, text: str, channel_idx: int = 0, reply_id: Optional[int] = None):
         if not self.interface:
             logger.error("Cannot send text: Interface not connected")
             return None
             
         try:
-            return self.interface.sendText(text, channelIndex=channel_idx, replyId=reply_id)
+            return await self._run_io(self.interface.sendText, text, channelIndex=channel_idx, replyId=reply_id)
         except Exception as e:
             logger.error(f"Failed to send text: {e}")
             if isinstance(e, BrokenPipeError) or "Broken pipe" in str(e):
                 self._on_connection_lost(self.interface)
             return None
 
+    async def send_text_batch(self, texts: List[str], channel_idx: int = 0, reply_id: Optional[int] = None):
+        """
+        Queues several text packets to be sent in order by the background sender.
+        Returns as soon as the batch is queued; reply_id is only attached to the first part.
+        """
+        await self._tx_queue.put((texts, channel_idx, reply_id, None))
+
+    async def send_queued_text(self, text: str, channel_idx: int = 0,
+                               reply_id: Optional[int] = None) -> asyncio.Future:
+        """
+        Queues a single text packet for the background sender, behind any queued
+        batches and paced like them. Returns as soon as it is queued, with a future
+        for the sent packet (None if sending failed).
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._tx_queue.put(([text], channel_idx, reply_id, future))
+        return future
+
+    async def _tx_loop(self):
+        """Send queued messages one packet at a time, paced by BATCH_SEND_INTERVAL."""
+        while True:
+            texts, channel_idx, reply_id, future = await self._tx_queue.get()
+            try:
+                for i, text in enumerate(texts):
+                    packet = await self.send_text(text, channel_idx, reply_id if i == 0 else None)
+                    if future and not future.done():
+                        future.set_result(packet)
+                    await asyncio.sleep(BATCH_SEND_INTERVAL)
+            except asyncio.CancelledError:
+                if future:
+                    future.cancel()
+                raise
+            except Exception as e:
+                logger.error(f"Failed to send queued message: {e}")
+                if future and not future.done():
+                    future.set_exception(e)
+            finally:
+                self._tx_queue.task_done()
+
+    def _dispatch(self, coro: Coroutine):
+        """Run a bridge handler as a fire-and-forget task."""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("LAN packet handler failed: %r", task.exception())
+
     def _on_meshtastic_message(self, packet, interface):
+        """Runs on the meshtastic reader thread: only hand the packet to the event loop."""
         if interface != self.interface:
             return
+        # Our own node's packets (e.g. what the bridge just sent) aren't relayed back
+        if packet.get("fromId") == self.node_id:
+            return
+        # Most traffic is telemetry, position and routing; only queue what we handle
+        if packet.get("decoded", {}).get("portnum") not in self._port_handlers:
+            return
+        self._loop.call_soon_threadsafe(self._enqueue_packet, packet)
 
+    def _enqueue_packet(self, packet):
+        try:
+            self._rx_queue.put_nowait(packet)
+        except asyncio.QueueFull:
+            logger.warning("LAN receive queue full, dropping packet %s", packet.get('id'))
+
+    async def _rx_loop(self):
+        """Process received packets in arrival order, taking everything already queued per wakeup."""
+        while True:
+            packets = [await self._rx_queue.get()]
+            while not self._rx_queue.empty():
+                packets.append(self._rx_queue.get_nowait())
+            for packet in packets:
+                self._process_packet(packet)
+
+    def _process_packet(self, packet):
         try:
             # packet is a dict
-            logger.debug(f"LAN Message received: {packet}")
-            
-            # Extract basic info
-            packet_id = packet.get("id")
-            from_id = packet.get("fromId")
-            
-            decoded = packet.get("decoded", {})
-            portnum = decoded.get("portnum")
-            
-            # Handle NODEINFO packets
-            if portnum == portnums_pb2.NODEINFO_APP:
-                self._handle_nodeinfo(packet)
-                return
-            
-            # Check for supported apps
-            # TEXT_MESSAGE_APP = 1
-            # REACTION_APP = 68
-            is_text_like = portnum == portnums_pb2.TEXT_MESSAGE_APP or portnum == 68
-            
-            if is_text_like:
-                # Create Mock Stats for LAN
-                rssi = packet.get("rxRssi", 0)
-                snr = packet.get("rxSnr", 0.0)
-                
-                # Extract hop count
-                hop_count = 0
-                if "hopStart" in packet and "hopLimit" in packet:
-                    hop_count = packet["hopStart"] - packet["hopLimit"]
-                
-                stats = ReceptionStats(
-                    gateway_id=self.node_id,
-                    rssi=rssi,
-                    snr=snr,
-                    hop_count=hop_count
-                )
-                
-                # Extract channel name from interface settings
-                channel_idx = packet.get("channel", 0)
-                channel_name = "Unknown"
-                if self.interface and self.interface.channels:
-                    for c in self.interface.channels:
-                        if c.index == channel_idx:
-                            channel_name = c.settings.name if hasattr(c.settings, 'name') else "Unknown"
-                            break
-                
-                packet["channel_name"] = channel_name
+            # Formatting a whole packet dict is expensive; skip it unless it's shown
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("LAN Message received: %s", packet)
 
-                asyncio.run_coroutine_threadsafe(
-                    self.bridge.handle_meshtastic_message(packet, "lan", stats),
-                    asyncio.get_event_loop()
-                )
-                
+            handler = self._port_handlers.get(packet.get("decoded", {}).get("portnum"))
+            if handler:
+                handler(packet)
         except Exception as e:
-            logger.error(f"Error processing LAN message: {e}", exc_info=True)
+            logger.error("Error processing LAN message: %s", e, exc_info=True)
+
+    def _handle_text(self, packet):
+        """Hand text and reaction packets from LAN to the bridge."""
+        # Create Mock Stats for LAN
+        rssi = packet.get("rxRssi", 0)
+        snr = packet.get("rxSnr", 0.0)
+        
+        # Extract hop count
+        hop_count = 0
+        if "hopStart" in packet and "hopLimit" in packet:
+            hop_count = packet["hopStart"] - packet["hopLimit"]
+        
+        stats = ReceptionStats(
+            gateway_id=self.node_id,
+            rssi=rssi,
+            snr=snr,
+            hop_count=hop_count
+        )
+        
+        # Resolve the channel name from the map built on connect
+        channel_idx = packet.get("channel", 0)
+        channel_name = self._channel_names.get(channel_idx)
+        if channel_name is None:
+            # The channel may have been added since connecting; re-read the config,
+            # keeping the current map if it can't be read
+            self._channel_names = self._read_channel_names() or self._channel_names
+            channel_name = self._channel_names.get(channel_idx, "Unknown")
+        packet["channel_name"] = channel_name
+
+        self._dispatch(self.bridge.handle_meshtastic_message(packet, "lan", stats))
     
     def _handle_nodeinfo(self, packet):
         """Handle NODEINFO packets from LAN to update the node database."""
@@ -204,10 +334,7 @@ class MeshtasticInterface:
             long_name = user_info.get("longName")
             
             if from_id:
-                asyncio.run_coroutine_threadsafe(
-                    self.bridge.handle_node_info(from_id, short_name, long_name),
-                    asyncio.get_event_loop()
-                )
+                self._dispatch(self.bridge.handle_node_info(from_id, short_name, long_name))
         except Exception as e:
-            logger.error(f"Error processing NODEINFO: {e}", exc_info=True)
+            logger.error("Error processing NODEINFO: %s", e, exc_info=True)
 
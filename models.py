@@ -1,8 +1,8 @@
 from dataclasses import dataclass, field
 import time
-from typing import List, Optional
+from typing import List, Optional, Set, Tuple, Union
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ReceptionStats:
     gateway_id: str
     rssi: int
@@ -10,15 +10,29 @@ class ReceptionStats:
     hop_count: int = 0
     timestamp: float = field(default_factory=time.time)
 
-@dataclass
+@dataclass(slots=True)
 class MessageState:
     packet_id: int
     matrix_event_id: Optional[str] 
     original_text: str
     sender: str
     reception_list: List[ReceptionStats] = field(default_factory=list)
-    replies: List[str] = field(default_factory=list)
+    # Packet IDs of attached reaction states; plain strings are legacy rendered replies
+    replies: List[Union[int, str]] = field(default_factory=list)
     last_update: float = field(default_factory=time.time)
     render_only_stats: bool = False
     related_event_id: Optional[str] = None
     parent_packet_id: Optional[int] = None
+    # Gateways already in reception_list, for O(1) duplicate checks
+    gateway_ids: Set[str] = field(init=False, repr=False, compare=False)
+    # Cached "[Sender]: text" header as (sender_name, text, html); rebuilt if the name changes
+    rendered_prefix: Optional[Tuple[str, str, str]] = field(default=None, init=False, repr=False, compare=False)
+    # original_text shortened for reply quotes, computed on first use
+    short_text: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    # Rendered reception stats as (list length, names version, text, html)
+    rendered_stats: Optional[Tuple[int, int, str, str]] = field(default=None, init=False, repr=False, compare=False)
+    # Hash of the (text, html) last sent to Matrix, to skip no-op edits
+    rendered_hash: Optional[int] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.gateway_ids = {s.gateway_id for s in self.reception_list}
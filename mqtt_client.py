@@ -1,18 +1,51 @@
 import asyncio
+import functools
 import logging
 import base64
+import re
+import struct
+from typing import Callable, Coroutine, Set, Tuple
 import paho.mqtt.client as mqtt
 from meshtastic import mesh_pb2, portnums_pb2
 from meshtastic.protobuf import mqtt_pb2
+from google.protobuf.internal import api_implementation
 from google.protobuf.message import DecodeError
-from google.protobuf.json_format import MessageToDict
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.backends import default_backend
 import config
 from models import ReceptionStats
 
 logger = logging.getLogger(__name__)
 
+# Decoded packets waiting for the event loop; beyond this new ones are dropped
+DISPATCH_QUEUE_SIZE = 1024
+
+_CTR_NONCE = struct.Struct("<QI4x").pack
+
+# Tapbacks; protobuf releases name 68 differently, so it is matched by number
+REACTION_PORTNUM = 68
+# Ports the bridge relays: node info, text and tapbacks
+_RELAYED_PORTNUMS = frozenset({portnums_pb2.NODEINFO_APP, portnums_pb2.TEXT_MESSAGE_APP, REACTION_PORTNUM})
+
+# The channel name is the topic level after the first 'e', 'c' or 'json' level
+_TOPIC_CHANNEL_RE = re.compile(r'(?:^|/)(?:e|c|json)/([^/]+)')
+
+
+@functools.lru_cache(maxsize=1024)
+def _extract_channel_name(topic: str) -> str:
+    """
+    Extracts channel name from topic.
+    Example: msh/EU_868/2/e/LongFast/!ae614908 -> LongFast
+    """
+    # Topics repeat per gateway, so results are cached
+    m = _TOPIC_CHANNEL_RE.search(topic)
+    return m.group(1) if m else "Unknown"
+
+
+@functools.lru_cache(maxsize=4096)
+def _node_id_to_str(node_id: int) -> str:
+    # Canonical !xxxxxxxx form, zero-padded like the meshtastic library's fromId
+    return f"!{node_id:08x}"
+
 class MqttClient:
     def __init__(self, bridge):
         self.bridge = bridge
@@ -20,36 +53,96 @@ class MqttClient:
         self.client.on_connect = self._on_connect
         self.client.on_message = self._on_message
         self.loop = None  # Will be set when start() is called
+        # (bridge handler, args) pairs handed over from paho's network thread
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=DISPATCH_QUEUE_SIZE)
+        self._dispatch_task = None
+        # Strong references to running handler tasks
+        self._tasks: Set[asyncio.Task] = set()
         
         if config.MQTT_USER and config.MQTT_PASSWORD:
             self.client.username_pw_set(config.MQTT_USER, config.MQTT_PASSWORD)
             
         if config.MQTT_USE_TLS:
             self.client.tls_set()
-            
-        self._connect_task = None
+
+        # Paho's network thread retries failed (re)connects with this backoff
+        self.client.reconnect_delay_set(min_delay=1, max_delay=30)
+        # Parse targets reused for every message. paho calls on_message from its single
+        # network thread and nothing keeps a reference past the callback
+        self._envelope = mqtt_pb2.ServiceEnvelope()
+        self._user = mesh_pb2.User()
+        # Channel key, decoded once; None disables decryption
+        self._aes = self._load_psk()
+
+    @staticmethod
+    def _load_psk():
+        key_b64 = config.MESHTASTIC_CHANNEL_PSK
+        if not key_b64:
+            return None
+        # Key is base64 encoded
+        try:
+            return algorithms.AES(base64.b64decode(key_b64))
+        except Exception as e:
+            logger.error(f"Invalid MESHTASTIC_CHANNEL_PSK, encrypted packets will be ignored: {e}")
+            return None
 
     def start(self):
-        self.loop = asyncio.get_event_loop()
-        self._connect_task = asyncio.create_task(self._connect_loop())
+        # MQTT is optional; without a broker the bridge runs on the LAN node alone
+        if not config.MQTT_BROKER:
+            logger.warning("MQTT_BROKER is not set, MQTT is disabled")
+            return
 
-    async def _connect_loop(self):
-        while True:
-            try:
-                logger.info(f"Connecting to MQTT Broker {config.MQTT_BROKER}...")
-                await asyncio.to_thread(self.client.connect, config.MQTT_BROKER, config.MQTT_PORT, 60)
-                self.client.loop_start()
-                logger.info("MQTT Client loop started.")
-                return
-            except Exception as e:
-                logger.error(f"Failed to connect to MQTT: {e}. Retrying in 5 seconds...")
-                await asyncio.sleep(5)
+        # Connecting happens on paho's network thread, which also handles retries.
+        # connect_async only validates its arguments here
+        logger.info(f"Connecting to MQTT Broker {config.MQTT_BROKER}...")
+        try:
+            self.client.connect_async(config.MQTT_BROKER, config.MQTT_PORT, 60)
+        except Exception as e:
+            logger.error(f"Invalid MQTT broker settings, MQTT is disabled: {e}")
+            return
+
+        self.loop = asyncio.get_running_loop()
+        self._dispatch_task = asyncio.create_task(self._dispatch_loop())
+        # Every MQTT frame is a protobuf parse; the pure-Python backend is many times slower
+        backend = api_implementation.Type()
+        if backend == "python":
+            logger.warning("protobuf is using its pure-Python backend; install a binary protobuf wheel (upb) for faster MQTT decoding")
+        else:
+            logger.info(f"protobuf backend: {backend}")
+        self.client.loop_start()
 
     def stop(self):
-        if self._connect_task:
-            self._connect_task.cancel()
-        self.client.loop_stop()
+        if self._dispatch_task is None:
+            return  # Never started
         self.client.disconnect()
+        self.client.loop_stop()
+        self._dispatch_task.cancel()
+
+    def _schedule(self, handler: Callable[..., Coroutine], *args):
+        """Queue a bridge handler call from paho's network thread."""
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._enqueue, (handler, args))
+        else:
+            logger.error("Event loop not set - unable to schedule message handling")
+
+    def _enqueue(self, item: Tuple[Callable[..., Coroutine], tuple]):
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            logger.warning("MQTT dispatch queue full, dropping packet")
+
+    async def _dispatch_loop(self):
+        """Start bridge handlers for queued packets in arrival order."""
+        while True:
+            handler, args = await self._queue.get()
+            task = asyncio.create_task(handler(*args))
+            self._tasks.add(task)
+            task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("MQTT packet handler failed: %r", task.exception())
 
     def _on_connect(self, client, userdata, flags, rc):
         if rc == 0:
@@ -80,7 +173,8 @@ class MqttClient:
             # if msg.topic.endswith("/json"): ...
             
             # Try parsing as ServiceEnvelope
-            se = mqtt_pb2.ServiceEnvelope()
+            # ParseFromString clears the reused envelope first
+            se = self._envelope
             try:
                 se.ParseFromString(msg.payload)
             except DecodeError:
@@ -89,7 +183,7 @@ class MqttClient:
 
             # Extract channel name from topic
             # Example: msh/EU_868/2/e/LongFast/!ae614908
-            channel_name = self._extract_channel_name(msg.topic)
+            channel_name = _extract_channel_name(msg.topic)
             
             self._process_service_envelope(se, channel_name)
 
@@ -102,196 +196,93 @@ class MqttClient:
             return
 
         # Gateway Stats
-        gateway_id = getattr(se, "gateway_id", "Unknown")
-        rssi = 0
-        snr = 0.0
-        hop_count = 0
-        
-        # Extract RSSI/SNR from the packet rx_rssi / rx_snr if available (from the reporting node's perspective)
-        # Or from the ServiceEnvelope itself if it reports reception stats of the bridge?
-        # Usually 'packet' contains 'rx_rssi' indicating how the gateway heard the node.
-        if hasattr(packet, "rx_rssi"):
-            rssi = packet.rx_rssi
-        if hasattr(packet, "rx_snr"):
-            snr = packet.rx_snr
-        
-        # Extract hop count/limit
-        if hasattr(packet, "hop_limit"):
-            # hop_count = original hop_limit - current hop_limit
-            # Meshtastic default is hop_limit=3, so if we see hop_limit=2, it's traveled 1 hop
-            # However, we don't know the original. Let's use hop_start if available.
-            pass
-        
-        if hasattr(packet, "hop_start"):
-            hop_start = packet.hop_start
-            hop_limit = getattr(packet, "hop_limit", 0)
-            hop_count = hop_start - hop_limit
-        else:
-            # Fallback: if we don't have hop_start, assume hop_count = 0 (direct)
-            hop_count = 0
-
-        # Create ReceptionStats
-        stats = ReceptionStats(gateway_id=gateway_id, rssi=rssi, snr=snr, hop_count=hop_count)
+        gateway_id = se.gateway_id or "Unknown"
 
         # Payload Decoding
         # Check if packet is already decoded or needs decryption
         
         if packet.HasField("decoded"):
             # Already decoded
-            self._handle_decoded_packet(packet, stats, channel_name)
-        elif packet.HasField("encrypted") and config.MESHTASTIC_CHANNEL_PSK:
+            self._handle_decoded_packet(packet, gateway_id, channel_name)
+        elif packet.HasField("encrypted") and self._aes is not None:
             # Manual Decryption
-            self._try_decrypt(packet, stats, channel_name)
+            self._try_decrypt(packet, gateway_id, channel_name)
 
-    def _handle_decoded_packet(self, packet, stats, channel_name: str):
+    @staticmethod
+    def _reception_stats(packet, gateway_id: str) -> ReceptionStats:
+        """How the reporting gateway heard the packet."""
+        # Scalar protobuf fields are always present (0 when unset), so no hasattr
+        # probes. Firmware too old to set hop_start reports 0: treat that as direct
+        hop_count = packet.hop_start - packet.hop_limit if packet.hop_start else 0
+        return ReceptionStats(gateway_id=gateway_id, rssi=packet.rx_rssi, snr=packet.rx_snr, hop_count=hop_count)
+
+    def _handle_decoded_packet(self, packet, gateway_id: str, channel_name: str):
         decoded = packet.decoded
+        # Most traffic is telemetry, position and routing; drop it before doing any work
+        if decoded.portnum not in _RELAYED_PORTNUMS:
+            return
         
         # Handle NODEINFO packets
         if decoded.portnum == portnums_pb2.NODEINFO_APP:
             self._handle_nodeinfo(packet)
             return
         
-        is_text = decoded.portnum == portnums_pb2.TEXT_MESSAGE_APP
-        is_reaction = decoded.portnum == 68 # REACTION_APP
-        
-        if is_text or is_reaction:
-            # Get all fields into a dict first. Include defaults to ensure we don't miss anything.
-            decoded_dict = MessageToDict(decoded, 
-                                         preserving_proto_field_name=True,
-                                         always_print_fields_with_no_presence=True)
-            
-            # Ensure text/emoji are strings if present
-            text = decoded_dict.get("text", "")
-            if not text and "payload" in decoded_dict:
-                 # If text is not set but payload is, try to decode payload
-                 try:
-                     text = decoded.payload.decode("utf-8")
-                 except Exception:
-                     text = ""
-            
-            emoji = decoded_dict.get("emoji", "")
-            if emoji and (is_reaction or not text):
-                text = emoji
-
-            # Meshtastic Data protobuf can have request_id or reply_id
-            # MessageToDict might convert these to 0 if they are default, or omit them 
-            # depending on settings. Preserving snake_case is important.
-            reply_id = decoded_dict.get("reply_id", decoded_dict.get("request_id", 0))
-            
-            # Construct a final dict for the bridge
-            packet_dict = {
-                "id": packet.id,
-                "fromId": self._node_id_to_str(getattr(packet, 'from')),
-                "channel": packet.channel,
-                "channel_name": channel_name,
-                "decoded": decoded_dict
+        # Read the few fields the bridge uses straight from the protobuf. For both
+        # ports the payload is the text (or the reaction's emoji); Data.emoji is
+        # only a flag marking tapbacks, not the emoji itself
+        text = decoded.payload.decode("utf-8", "replace")
+
+        stats = self._reception_stats(packet, gateway_id)
+
+        # Construct a final dict for the bridge
+        packet_dict = {
+            "id": packet.id,
+            "fromId": _node_id_to_str(getattr(packet, 'from')),
+            "channel": packet.channel,
+            "channel_name": channel_name,
+            "decoded": {
+                "text": text,
+                "portnum": decoded.portnum,
+                "replyId": decoded.reply_id or decoded.request_id,
+                "emoji": decoded.emoji,
             }
-            
-            # Ensure normalized fields are present in nested decoded dict for bridge
-            packet_dict["decoded"]["text"] = text
-            packet_dict["decoded"]["portnum"] = decoded.portnum
-            packet_dict["decoded"]["replyId"] = reply_id
-            packet_dict["decoded"]["emoji"] = emoji
-            
-            # Bridge handling (async call from sync callback requires run_coroutine_threadsafe)
-            if self.loop:
-                asyncio.run_coroutine_threadsafe(
-                    self.bridge.handle_meshtastic_message(packet_dict, "mqtt", stats),
-                    self.loop
-                )
-            else:
-                logger.error("Event loop not set - unable to schedule message handling")
+        }
+        
+        # The coroutine is only created once the packet reaches the event loop
+        self._schedule(self.bridge.handle_meshtastic_message, packet_dict, "mqtt", stats)
     
     def _handle_nodeinfo(self, packet):
         """Handle NODEINFO packets to update the node database."""
         try:
-            from meshtastic import mesh_pb2
-            
-            node_id = self._node_id_to_str(getattr(packet, 'from'))
+            node_id = _node_id_to_str(getattr(packet, 'from'))
             decoded = packet.decoded
             
             # Parse the User protobuf from the payload
-            user = mesh_pb2.User()
+            user = self._user
             user.ParseFromString(decoded.payload)
             
             short_name = user.short_name if user.short_name else None
             long_name = user.long_name if user.long_name else None
             
-            if self.loop:
-                asyncio.run_coroutine_threadsafe(
-                    self.bridge.handle_node_info(node_id, short_name, long_name),
-                    self.loop
-                )
+            self._schedule(self.bridge.handle_node_info, node_id, short_name, long_name)
         except Exception as e:
             logger.error(f"Error processing NODEINFO: {e}", exc_info=True)
 
-    def _node_id_to_str(self, node_id):
-        # Convert integer node_id to !Hex string
-        return "!" + hex(node_id)[2:]
-
-    def _try_decrypt(self, packet, stats, channel_name: str):
+    def _try_decrypt(self, packet, gateway_id: str, channel_name: str):
         try:
-            key_b64 = config.MESHTASTIC_CHANNEL_PSK
-            if not key_b64:
-                return
-
-            # Key is base64 encoded
-            try:
-                key = base64.b64decode(key_b64)
-            except Exception:
-                logger.error("Invalid base64 key in MESHTASTIC_CHANNEL_PSK")
-                return
-            
-            # Nonce Construction (Meshtastic 1.2+ usually)
-            # Packet ID (4 bytes) + From Node (4 bytes) + 8 bytes padding ??
-            # Official docs say: 12 bytes nonce (PacketID + SenderNodeID + extra?)
-            # Actually, let's verify standard: PacketID (LE 4B) + FromNodeID (LE 4B) + 8 bytes Counter=0
-            # Wait, AES-CTR requires a 16-byte block as IV.
-            # Common Meshtastic usage:
-            # Nonce = packetId (4 bytes) + fromNodeId (4 bytes) + 8 bytes zero
-            
-            packet_id_bytes = packet.id.to_bytes(4, byteorder='little')
-            from_id_bytes = getattr(packet, 'from').to_bytes(4, byteorder='little')
-            
-            # Construct 16-byte IV for CTR mode (Nonce + Counter)
-            # Meshtastic use:
-            # bytes 0-3: Packet ID
-            # bytes 4-7: From Node ID
-            # bytes 8-15: 0 (This serves as the extra nonce space or initial counter block?)
-            # Actually CTR mode in cryptography splits this. 
-            # We pass full 16 bytes as 'nonce' argument to modes.CTR()
+            # 16-byte CTR block as the firmware builds it (CryptoEngine::initNonce):
+            # packet ID as LE uint64, sender node number as LE uint32, 4 zero bytes
+            nonce_iv = _CTR_NONCE(packet.id, getattr(packet, 'from'))
             
-            nonce_iv = packet_id_bytes + from_id_bytes + (b'\x00' * 8)
-            
-            cipher = Cipher(algorithms.AES(key), modes.CTR(nonce_iv), backend=default_backend())
+            cipher = Cipher(self._aes, modes.CTR(nonce_iv))
             decryptor = cipher.decryptor()
             decrypted_data = decryptor.update(packet.encrypted) + decryptor.finalize()
             
-            # Parse decrypted data as 'Data' protobuf
-            data_pb = mesh_pb2.Data()
-            data_pb.ParseFromString(decrypted_data)
-            
-            # Populate packet.decoded
-            packet.decoded.CopyFrom(data_pb)
+            # Parse the decrypted 'Data' protobuf straight into packet.decoded
+            packet.decoded.ParseFromString(decrypted_data)
             
             logger.info(f"Successfully decrypted packet {packet.id}")
-            self._handle_decoded_packet(packet, stats, channel_name)
+            self._handle_decoded_packet(packet, gateway_id, channel_name)
 
         except Exception as e:
             logger.error(f"Failed to decrypt packet {packet.id}: {e}")
-
-    def _node_id_to_str(self, node_id):
-        # Convert integer node_id to !Hex string
-        return "!" + hex(node_id)[2:]
-
-    def _extract_channel_name(self, topic: str) -> str:
-        """
-        Extracts channel name from topic.
-        Example: msh/EU_868/2/e/LongFast/!ae614908 -> LongFast
-        """
-        parts = topic.split('/')
-        # The channel name is usually the part after 'e', 'c', or 'json'
-        for i, part in enumerate(parts):
-            if part in ('e', 'c', 'json') and i + 1 < len(parts):
-                return parts[i + 1]
-        return "Unknown"
@@ -1,23 +1,69 @@
 import sqlite3
 import logging
 import json
+import queue
+import threading
+from concurrent.futures import Future
 from dataclasses import asdict
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterable, List, NamedTuple, Tuple, Union
 from contextlib import contextmanager
 import config
 from models import MessageState, ReceptionStats
 
 logger = logging.getLogger(__name__)
 
+# Most queued batches the writer thread folds into one transaction
+WRITER_MAX_BATCHES = 64
+
+_UPSERT_NODE = '''
+    INSERT INTO nodes (node_id, short_name, long_name, last_seen)
+    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(node_id) DO UPDATE SET
+        short_name = COALESCE(?, short_name),
+        long_name = COALESCE(?, long_name),
+        last_seen = CURRENT_TIMESTAMP
+'''
+
+
+class _NodeUpdate(NamedTuple):
+    """A queued node upsert; the future receives the node's resolved name."""
+    node_id: str
+    short_name: Optional[str]
+    long_name: Optional[str]
+    future: "Future[str]"
+
+
+_UPSERT_MESSAGE = '''
+    INSERT INTO messages (packet_id, matrix_event_id, original_text, sender, reception_list_json, replies_json, last_update, render_only_stats, related_event_id, parent_packet_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(packet_id) DO UPDATE SET
+        matrix_event_id = excluded.matrix_event_id,
+        original_text = excluded.original_text,
+        sender = excluded.sender,
+        reception_list_json = excluded.reception_list_json,
+        replies_json = excluded.replies_json,
+        last_update = excluded.last_update,
+        render_only_stats = excluded.render_only_stats,
+        related_event_id = excluded.related_event_id,
+        parent_packet_id = excluded.parent_packet_id
+'''
+
 
 class NodeDatabase:
     def __init__(self, db_path: str = config.NODE_DB_PATH):
         self.db_path = db_path
+        # Items are message row batches, node updates, or None to stop the writer
+        self._write_queue: "queue.Queue[Union[List[Tuple], _NodeUpdate, None]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        # Guards _writer so nothing is queued behind the stop sentinel
+        self._writer_lock = threading.Lock()
         self._init_database()
     
     def _init_database(self):
         """Initialize the database schema."""
         with self._get_connection() as conn:
+            # WAL lets the batched message writes commit without blocking readers
+            conn.execute('PRAGMA journal_mode=WAL')
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS nodes (
                     node_id TEXT PRIMARY KEY,
@@ -36,7 +82,8 @@ class NodeDatabase:
                     replies_json TEXT,
                     last_update REAL,
                     render_only_stats BOOLEAN DEFAULT 0,
-                    related_event_id TEXT DEFAULT NULL
+                    related_event_id TEXT DEFAULT NULL,
+                    parent_packet_id INTEGER DEFAULT NULL
                 )
             ''')
             
@@ -68,19 +115,33 @@ class NodeDatabase:
         finally:
             conn.close()
     
-    def update_node(self, node_id: str, short_name: Optional[str] = None, long_name: Optional[str] = None):
-        """Update or insert a node's information."""
+    def update_node(self, node_id: str, short_name: Optional[str] = None, long_name: Optional[str] = None) -> str:
+        """Update or insert a node's information and return its resolved name."""
         with self._get_connection() as conn:
-            conn.execute('''
-                INSERT INTO nodes (node_id, short_name, long_name, last_seen)
-                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-                ON CONFLICT(node_id) DO UPDATE SET
-                    short_name = COALESCE(?, short_name),
-                    long_name = COALESCE(?, long_name),
-                    last_seen = CURRENT_TIMESTAMP
-            ''', (node_id, short_name, long_name, short_name, long_name))
+            name = self._upsert_node(conn, node_id, short_name, long_name)
             conn.commit()
-            logger.debug(f"Updated node {node_id}: short={short_name}, long={long_name}")
+        return name
+
+    def queue_node_update(self, node_id: str, short_name: Optional[str] = None,
+                          long_name: Optional[str] = None) -> "Future[str]":
+        """Hand a node update to the writer thread; the future resolves to the node's name.
+
+        Falls back to a direct write if the writer isn't running.
+        """
+        future: "Future[str]" = Future()
+        if not self._enqueue(_NodeUpdate(node_id, short_name, long_name, future)):
+            future.set_result(self.update_node(node_id, short_name, long_name))
+        return future
+
+    def _upsert_node(self, conn, node_id: str, short_name: Optional[str], long_name: Optional[str]) -> str:
+        conn.execute(_UPSERT_NODE, (node_id, short_name, long_name, short_name, long_name))
+        row = conn.execute('SELECT short_name, long_name FROM nodes WHERE node_id = ?', (node_id,)).fetchone()
+        logger.debug(f"Updated node {node_id}: short={short_name}, long={long_name}")
+        return self._resolve_name(node_id, *row)
+
+    @staticmethod
+    def _resolve_name(node_id: str, short_name: Optional[str], long_name: Optional[str]) -> str:
+        return short_name or long_name or node_id
     
     def get_node_name(self, node_id: str) -> str:
         """Get a human-readable name for a node ID.
@@ -104,6 +165,13 @@ class NodeDatabase:
             # Fallback to node_id
             return node_id
     
+    def load_all_names(self) -> Dict[str, str]:
+        """Load the resolved name of every known node, keyed by node ID."""
+        with self._get_connection() as conn:
+            cursor = conn.execute('SELECT node_id, short_name, long_name FROM nodes')
+            return {node_id: self._resolve_name(node_id, short_name, long_name)
+                    for node_id, short_name, long_name in cursor}
+
     def get_all_nodes(self):
         """Get all nodes from the database."""
         with self._get_connection() as conn:
@@ -114,43 +182,136 @@ class NodeDatabase:
 
     def save_message_state(self, state: MessageState):
         """Save or update a MessageState object."""
-        reception_json = json.dumps([asdict(s) for s in state.reception_list])
-        replies_json = json.dumps(state.replies)
-        
+        self.save_message_states([state])
+
+    def save_message_states(self, states: Iterable[MessageState]):
+        """Save or update several MessageState objects in a single transaction."""
+        rows = [self._message_row(state) for state in states]
         with self._get_connection() as conn:
-            conn.execute('''
-                INSERT INTO messages (packet_id, matrix_event_id, original_text, sender, reception_list_json, replies_json, last_update, render_only_stats, related_event_id, parent_packet_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT(packet_id) DO UPDATE SET
-                    matrix_event_id = excluded.matrix_event_id,
-                    original_text = excluded.original_text,
-                    sender = excluded.sender,
-                    reception_list_json = excluded.reception_list_json,
-                    replies_json = excluded.replies_json,
-                    last_update = excluded.last_update,
-                    render_only_stats = excluded.render_only_stats,
-                    related_event_id = excluded.related_event_id,
-                    parent_packet_id = excluded.parent_packet_id
-            ''', (
-                state.packet_id, 
-                state.matrix_event_id, 
-                state.original_text, 
-                state.sender, 
-                reception_json, 
-                replies_json, 
-                state.last_update,
-                state.render_only_stats,
-                state.related_event_id,
-                state.parent_packet_id
-            ))
+            conn.executemany(_UPSERT_MESSAGE, rows)
             conn.commit()
+
+    def queue_message_states(self, states: Iterable[MessageState]):
+        """Hand MessageStates to the writer thread without blocking the caller.
+
+        Rows are serialized immediately, so later changes to the states don't
+        race with the write. Falls back to a direct write if the writer isn't running.
+        """
+        rows = [self._message_row(state) for state in states]
+        if not self._enqueue(rows):
+            with self._get_connection() as conn:
+                conn.executemany(_UPSERT_MESSAGE, rows)
+                conn.commit()
+
+    def _enqueue(self, item: Union[List[Tuple], _NodeUpdate]) -> bool:
+        """Queue an item for the writer; False if the writer isn't running (or is stopping)."""
+        with self._writer_lock:
+            if self._writer is None:
+                return False
+            self._write_queue.put_nowait(item)
+            return True
+
+    def start_writer(self):
+        """Start the background thread that performs queued message and node writes."""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._writer_loop, name="node-db-writer", daemon=True)
+                self._writer.start()
+
+    def close(self):
+        """Write everything still queued and stop the writer thread."""
+        with self._writer_lock:
+            # Writes arriving from here on go straight to the database
+            writer, self._writer = self._writer, None
+            if writer is None:
+                return
+            self._write_queue.put(None)
+        writer.join()
+        # Only left over if the writer died; don't leave node update callers waiting
+        while not self._write_queue.empty():
+            item = self._write_queue.get_nowait()
+            if isinstance(item, _NodeUpdate):
+                item.future.set_exception(RuntimeError("Node database writer stopped"))
+            elif item:
+                logger.error(f"Dropped {len(item)} queued message states: writer stopped")
+
+    def _writer_loop(self):
+        conn = sqlite3.connect(self.db_path)
+        # With WAL, NORMAL only syncs at checkpoints; a crash can lose the last
+        # few commits but never corrupts the database
+        conn.execute('PRAGMA synchronous=NORMAL')
+        try:
+            running = True
+            while running:
+                batches = [self._write_queue.get()]
+                # Fold whatever else is already waiting into the same transaction
+                while len(batches) < WRITER_MAX_BATCHES:
+                    try:
+                        batches.append(self._write_queue.get_nowait())
+                    except queue.Empty:
+                        break
+                rows = []
+                node_updates = []
+                for item in batches:
+                    if item is None:
+                        running = False
+                    elif isinstance(item, _NodeUpdate):
+                        node_updates.append(item)
+                    else:
+                        rows.extend(item)
+                if rows:
+                    try:
+                        with conn:
+                            conn.executemany(_UPSERT_MESSAGE, rows)
+                    except Exception as e:
+                        logger.error(f"Failed to write {len(rows)} message states: {e}")
+                if node_updates:
+                    self._write_node_updates(conn, node_updates)
+        finally:
+            conn.close()
+
+    def _write_node_updates(self, conn, updates: List[_NodeUpdate]):
+        """Apply queued node updates in one transaction, then resolve their futures."""
+        try:
+            with conn:
+                names = [self._upsert_node(conn, u.node_id, u.short_name, u.long_name) for u in updates]
+        except Exception as e:
+            logger.error(f"Failed to write {len(updates)} node updates: {e}")
+            for u in updates:
+                u.future.set_exception(e)
+            return
+        for u, name in zip(updates, names):
+            u.future.set_result(name)
+
+    @staticmethod
+    def _message_row(state: MessageState) -> Tuple:
+        return (
+            state.packet_id,
+            state.matrix_event_id,
+            state.original_text,
+            state.sender,
+            json.dumps([asdict(s) for s in state.reception_list]),
+            json.dumps(state.replies),
+            state.last_update,
+            state.render_only_stats,
+            state.related_event_id,
+            state.parent_packet_id
+        )
     
-    def load_message_states(self) -> Dict[int, MessageState]:
-        """Load all MessageState objects from the database."""
+    def load_message_states(self, limit: Optional[int] = None) -> Dict[int, MessageState]:
+        """Load MessageState objects from the database, oldest first.
+
+        If limit is given, only the most recently updated states are loaded.
+        """
         states = {}
         with self._get_connection() as conn:
-            cursor = conn.execute('SELECT packet_id, matrix_event_id, original_text, sender, reception_list_json, replies_json, last_update, render_only_stats, related_event_id, parent_packet_id FROM messages')
+            cursor = conn.execute(
+                'SELECT packet_id, matrix_event_id, original_text, sender, reception_list_json, replies_json, last_update, render_only_stats, related_event_id, parent_packet_id '
+                'FROM messages ORDER BY last_update DESC LIMIT ?',
+                (limit if limit is not None else -1,)
+            )
             rows = cursor.fetchall()
+            rows.reverse()
             
             for row in rows:
                 packet_id, matrix_event_id, text, sender, rx_json, replies_json, last_update, render_only_stats, related_event_id, parent_packet_id = row
@@ -158,8 +319,10 @@ class NodeDatabase:
                 try:
                     rx_list_data = json.loads(rx_json)
                     reception_list = [ReceptionStats(**d) for d in rx_list_data]
+                    # The bridge keeps reception lists ordered by RSSI (strongest first)
+                    reception_list.sort(key=lambda s: s.rssi, reverse=True)
                     
-                    replies = json.loads(replies_json)
+                    replies = json.loads(replies_json) if replies_json else []
                     
                     state = MessageState(
                         packet_id=packet_id,
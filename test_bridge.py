@@ -1,8 +1,19 @@
 import asyncio
+import os
+import tempfile
 import unittest
+from types import SimpleNamespace
+from concurrent.futures import Future
 from unittest.mock import MagicMock, AsyncMock, patch
-from bridge import MeshtasticMatrixBridge
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from nio import ProfileGetDisplayNameResponse, RoomSendResponse
+from bridge import MeshtasticMatrixBridge, _shorten
+from matrix_bot import MatrixBot
+from meshtastic import mesh_pb2, portnums_pb2
+from meshtastic_interface import MeshtasticInterface
+from mqtt_client import MqttClient, _node_id_to_str
 from models import ReceptionStats
+from node_database import NodeDatabase
 
 class TestBridge(unittest.TestCase):
     def setUp(self):
@@ -10,13 +21,22 @@ class TestBridge(unittest.TestCase):
         self.node_db_patcher = patch('bridge.NodeDatabase')
         self.mock_node_db_cls = self.node_db_patcher.start()
         self.mock_node_db = self.mock_node_db_cls.return_value
-        self.mock_node_db.get_node_name.side_effect = lambda x: x 
+        self.mock_node_db.load_all_names.return_value = {}
+        def queue_node_update(node_id, short_name, long_name):
+            future = Future()
+            future.set_result(short_name or long_name or node_id)
+            return future
+        self.mock_node_db.queue_node_update.side_effect = queue_node_update
         self.mock_node_db.load_message_states.return_value = {}
 
         self.bridge = MeshtasticMatrixBridge()
         self.bridge.matrix_bot = AsyncMock()
         self.bridge.mqtt_client = MagicMock()
         self.bridge.meshtastic_interface = MagicMock()
+        self.bridge.meshtastic_interface.send_text = AsyncMock()
+        self.bridge.meshtastic_interface.send_tapback = AsyncMock()
+        self.bridge.meshtastic_interface.send_text_batch = AsyncMock()
+        self.bridge.meshtastic_interface.send_queued_text = AsyncMock()
         
     def tearDown(self):
         self.node_db_patcher.stop()
@@ -54,6 +74,10 @@ class TestBridge(unittest.TestCase):
             # Duplicate from GatewayB
             stats2 = ReceptionStats(gateway_id="GatewayB", rssi=-90, snr=5.0)
             await self.bridge.handle_meshtastic_message(packet, "mqtt", stats2)
+
+            # Edits are debounced; nothing is sent until the burst settles
+            self.bridge.matrix_bot.edit_message.assert_not_called()
+            await self.bridge._flush_pending_edits()
             
             # Verify edit called
             self.bridge.matrix_bot.edit_message.assert_called_once()
@@ -65,6 +89,7 @@ class TestBridge(unittest.TestCase):
             # Duplicate from GatewayA again (should ignore)
             self.bridge.matrix_bot.reset_mock()
             await self.bridge.handle_meshtastic_message(packet, "mqtt", stats1)
+            await self.bridge._flush_pending_edits()
             self.bridge.matrix_bot.edit_message.assert_not_called()
 
         asyncio.run(run())
@@ -90,6 +115,8 @@ class TestBridge(unittest.TestCase):
             kwargs = call_args[1]
             # args: (text, html)
             self.assertIn("This is a reply", args[0])
+            self.assertTrue(args[0].startswith("> <!Sender> Original\n\n"))
+            self.assertIn("/event_100\">In reply to</a>", args[1])
             self.assertEqual(kwargs['reply_to'], "event_100")
 
             # Emoji Reply (Should EDIT original)
@@ -119,12 +146,29 @@ class TestBridge(unittest.TestCase):
             
             # Verify split
             # "[@user:matrix.org]: AAAA..." is > 200 bytes
-            # Should call send_text multiple times
-            self.assertTrue(self.bridge.meshtastic_interface.send_text.call_count >= 2)
+            # Should send the parts as one batch
+            self.bridge.meshtastic_interface.send_queued_text.assert_not_called()
+            self.bridge.meshtastic_interface.send_text_batch.assert_awaited_once()
             
-            calls = self.bridge.meshtastic_interface.send_text.call_args_list
-            first_msg = calls[0][0][0]
-            self.assertTrue(first_msg.startswith("(1/"))
+            messages = self.bridge.meshtastic_interface.send_text_batch.call_args[0][0]
+            self.assertTrue(len(messages) >= 2)
+            self.assertTrue(messages[0].startswith("(1/"))
+
+        asyncio.run(run())
+
+    def test_matrix_message_splitting_keeps_multibyte_characters(self):
+        async def run():
+            event = MagicMock()
+            event.sender = "@user:matrix.org"
+            event.body = "👍" * 100 # 4 bytes each
+            self.bridge.matrix_bot.get_display_name.return_value = "user"
+
+            await self.bridge.handle_matrix_message(event)
+
+            messages = self.bridge.meshtastic_interface.send_text_batch.call_args[0][0]
+            self.assertTrue(len(messages) >= 2)
+            parts = [m.split(") ", 1)[1] for m in messages]
+            self.assertEqual("".join(parts), "[user]: " + "👍" * 100)
 
         asyncio.run(run())
 
@@ -146,12 +190,9 @@ class TestBridge(unittest.TestCase):
                 }
             }
             
-            # Mock send_tapback method (since we added it to MeshtasticInterface class)
-            self.bridge.meshtastic_interface.send_tapback = MagicMock()
-            
             await self.bridge.handle_matrix_reaction(event)
             
-            self.bridge.meshtastic_interface.send_tapback.assert_called_with(999, "👍")
+            self.bridge.meshtastic_interface.send_tapback.assert_awaited_with(999, "👍", channel_idx=0)
 
         asyncio.run(run())
 
@@ -163,12 +204,15 @@ class TestBridge(unittest.TestCase):
             event.body = "Matrix Message"
             event.event_id = "user_event_id_555"
             
-            # Mock send_text returning a packet
+            # Mock the queued send returning a packet
             mock_packet = MagicMock()
             mock_packet.id = 555
-            self.bridge.meshtastic_interface.send_text.return_value = mock_packet
+            sent = asyncio.get_running_loop().create_future()
+            sent.set_result(mock_packet)
+            self.bridge.meshtastic_interface.send_queued_text.return_value = sent
             
             await self.bridge.handle_matrix_message(event)
+            await asyncio.sleep(0) # let the send's done-callback run
             
             # Verify state initialized
             self.assertIn(555, self.bridge.message_state)
@@ -185,6 +229,7 @@ class TestBridge(unittest.TestCase):
             self.bridge.matrix_bot.send_message.return_value = "stats_event_id"
             
             await self.bridge.handle_meshtastic_message(packet_echo, "mqtt", stats)
+            await self.bridge._flush_pending_edits()
             
             # Verify send_message was called with stats ONLY (and NO reply_to)
             self.bridge.matrix_bot.send_message.assert_called_once()
@@ -201,5 +246,542 @@ class TestBridge(unittest.TestCase):
 
         asyncio.run(run())
 
+    def test_matrix_message_handler_does_not_wait_for_busy_queue(self):
+        async def run():
+            iface = MeshtasticInterface(self.bridge)
+            iface.interface = MagicMock()
+            iface.interface.sendText.side_effect = lambda text, channelIndex, replyId: SimpleNamespace(id=777)
+            self.bridge.meshtastic_interface = iface
+
+            event = MagicMock()
+            event.sender = "@user:matrix.org"
+            event.body = "Matrix Message"
+            event.event_id = "user_event_id_777"
+
+            with patch("meshtastic_interface.BATCH_SEND_INTERVAL", 0.05):
+                iface._tx_task = asyncio.create_task(iface._tx_loop())
+                await iface.send_text_batch(["(1/3) a", "(2/3) b", "(3/3) c"])
+                # Returns while the split message is still being paced out
+                await asyncio.wait_for(self.bridge.handle_matrix_message(event), 0.05)
+                self.assertNotIn(777, self.bridge.message_state)
+
+                await asyncio.wait_for(iface._tx_queue.join(), 1)
+                await asyncio.sleep(0)
+
+            self.assertEqual(self.bridge.message_state[777].related_event_id, "user_event_id_777")
+            iface._tx_task.cancel()
+            iface._io.shutdown()
+
+        asyncio.run(run())
+
+    def test_reception_list_sorted_by_rssi(self):
+        async def run():
+            packet = {"id": 321, "fromId": "!Sender", "decoded": {"text": "Hello"}}
+            self.bridge.matrix_bot.send_message.return_value = "event_id_321"
+            await self.bridge.handle_meshtastic_message(packet, "mqtt", ReceptionStats(gateway_id="Weak", rssi=-110, snr=1.0))
+            await self.bridge.handle_meshtastic_message(packet, "mqtt", ReceptionStats(gateway_id="Strong", rssi=-60, snr=9.0))
+            await self.bridge.handle_meshtastic_message(packet, "mqtt", ReceptionStats(gateway_id="Mid", rssi=-85, snr=4.0))
+            await self.bridge._flush_pending_edits()
+
+            gateways = [s.gateway_id for s in self.bridge.message_state[321].reception_list]
+            self.assertEqual(gateways, ["Strong", "Mid", "Weak"])
+
+            new_content = self.bridge.matrix_bot.edit_message.call_args[0][1]
+            self.assertLess(new_content.index("Strong"), new_content.index("Mid"))
+            self.assertLess(new_content.index("Mid"), new_content.index("Weak"))
+
+        asyncio.run(run())
+
+    def test_duplicate_burst_coalesced_into_one_edit(self):
+        async def run():
+            packet = {"id": 456, "fromId": "!Sender", "decoded": {"text": "Hello"}}
+            self.bridge.matrix_bot.send_message.return_value = "event_id_456"
+            await self.bridge.handle_meshtastic_message(packet, "mqtt", ReceptionStats(gateway_id="G0", rssi=-80, snr=1.0))
+
+            with patch('bridge.config.MATRIX_EDIT_DEBOUNCE', 0.01):
+                for i in range(1, 5):
+                    await self.bridge.handle_meshtastic_message(packet, "mqtt", ReceptionStats(gateway_id=f"G{i}", rssi=-80 - i, snr=1.0))
+                await asyncio.sleep(0.05)
+
+            self.bridge.matrix_bot.edit_message.assert_called_once()
+            new_content = self.bridge.matrix_bot.edit_message.call_args[0][1]
+            for i in range(5):
+                self.assertIn(f"G{i}", new_content)
+
+        asyncio.run(run())
+
+    def test_state_writes_are_batched(self):
+        async def run():
+            packet = {"id": 789, "fromId": "!Sender", "decoded": {"text": "Hello"}}
+            self.bridge.matrix_bot.send_message.return_value = "event_id_789"
+            await self.bridge.handle_meshtastic_message(packet, "mqtt", ReceptionStats(gateway_id="G1", rssi=-80, snr=1.0))
+            await self.bridge.handle_meshtastic_message(packet, "mqtt", ReceptionStats(gateway_id="G2", rssi=-90, snr=1.0))
+
+            # Nothing written synchronously on the receive path
+            self.mock_node_db.save_message_state.assert_not_called()
+            self.mock_node_db.queue_message_states.assert_not_called()
+
+            self.bridge._flush_dirty()
+            self.mock_node_db.queue_message_states.assert_called_once()
+            states = self.mock_node_db.queue_message_states.call_args[0][0]
+            self.assertEqual([s.packet_id for s in states], [789])
+
+        asyncio.run(run())
+
+    def test_full_state_batch_skips_persist_delay(self):
+        async def run():
+            task = asyncio.create_task(self.bridge._persist_loop())
+            with patch('bridge.PERSIST_BATCH_MAX', 2), patch('bridge.PERSIST_DELAY', 60):
+                for pid in (1, 2):
+                    packet = {"id": pid, "fromId": "!Sender", "decoded": {"text": f"Hello {pid}"}}
+                    await self.bridge.handle_meshtastic_message(packet, "mqtt", ReceptionStats(gateway_id="G1", rssi=-80, snr=1.0))
+                await asyncio.sleep(0.05)
+            task.cancel()
+            self.mock_node_db.queue_message_states.assert_called_once()
+            states = self.mock_node_db.queue_message_states.call_args[0][0]
+            self.assertEqual(sorted(s.packet_id for s in states), [1, 2])
+
+        asyncio.run(run())
+
+    def test_concurrent_copies_of_same_packet(self):
+        async def run():
+            async def slow_send(*args, **kwargs):
+                await asyncio.sleep(0.01)
+                return "event_id_42"
+            self.bridge.matrix_bot.send_message.side_effect = slow_send
+
+            packet = {"id": 42, "fromId": "!Sender", "decoded": {"text": "Hello"}}
+            await asyncio.gather(
+                self.bridge.handle_meshtastic_message(packet, "mqtt", ReceptionStats(gateway_id="G1", rssi=-80, snr=1.0)),
+                self.bridge.handle_meshtastic_message(packet, "lan", ReceptionStats(gateway_id="G2", rssi=-90, snr=1.0)),
+                self.bridge.handle_meshtastic_message(packet, "mqtt", ReceptionStats(gateway_id="G3", rssi=-95, snr=1.0)),
+            )
+
+            # Later copies waited for the first and were treated as duplicates
+            self.bridge.matrix_bot.send_message.assert_called_once()
+            self.assertEqual(self.bridge.message_state[42].gateway_ids, {"G1", "G2", "G3"})
+            self.assertEqual(self.bridge._in_flight, set())
+
+        asyncio.run(run())
+
+    def test_message_state_lru_eviction(self):
+        async def run():
+            with patch('bridge.config.MESSAGE_STATE_LIMIT', 2):
+                for pid in (1, 2):
+                    self.bridge.matrix_bot.send_message.return_value = f"event_{pid}"
+                    await self.bridge.handle_meshtastic_message({"id": pid, "fromId": "!Sender", "decoded": {"text": "Hello there"}}, "mqtt",
+                                                                ReceptionStats(gateway_id="G1", rssi=-80, snr=1.0))
+                # A duplicate of 1 makes 2 the least recently used entry
+                await self.bridge.handle_meshtastic_message({"id": 1, "fromId": "!Sender", "decoded": {"text": "Hello there"}}, "mqtt",
+                                                            ReceptionStats(gateway_id="G2", rssi=-80, snr=1.0))
+                self.bridge.matrix_bot.send_message.return_value = "event_3"
+                await self.bridge.handle_meshtastic_message({"id": 3, "fromId": "!Sender", "decoded": {"text": "Hello again"}}, "mqtt",
+                                                            ReceptionStats(gateway_id="G1", rssi=-80, snr=1.0))
+
+            self.assertEqual(list(self.bridge.message_state), [1, 3])
+            self.assertNotIn("event_2", self.bridge.event_to_packet)
+            self.assertEqual(self.bridge.event_to_packet["event_3"], 3)
+
+        asyncio.run(run())
+
+    def test_unchanged_update_skips_edit(self):
+        async def run():
+            packet = {"id": 654, "fromId": "!Sender", "decoded": {"text": "Hello"}}
+            self.bridge.matrix_bot.send_message.return_value = "event_id_654"
+            await self.bridge.handle_meshtastic_message(packet, "mqtt", ReceptionStats(gateway_id="G1", rssi=-80, snr=1.0))
+            state = self.bridge.message_state[654]
+
+            # Same content as the initial message: no edit
+            await self.bridge._update_matrix_message(state)
+            self.bridge.matrix_bot.edit_message.assert_not_called()
+
+            state.reception_list.append(ReceptionStats(gateway_id="G2", rssi=-90, snr=1.0))
+            await self.bridge._update_matrix_message(state)
+            await self.bridge._update_matrix_message(state)
+            self.bridge.matrix_bot.edit_message.assert_called_once()
+
+        asyncio.run(run())
+
+    def test_legacy_reply_strings_are_html_escaped(self):
+        async def run():
+            packet = {"id": 321, "fromId": "!Sender", "decoded": {"text": "Hello"}}
+            self.bridge.matrix_bot.send_message.return_value = "event_id_321"
+            await self.bridge.handle_meshtastic_message(packet, "mqtt", ReceptionStats(gateway_id="G1", rssi=-80, snr=1.0))
+            state = self.bridge.message_state[321]
+            state.replies.append("<b>Bob</b> & co: 👍")
+
+            await self.bridge._update_matrix_message(state)
+            _, text, html = self.bridge.matrix_bot.edit_message.call_args[0]
+            self.assertIn("\n<b>Bob</b> & co: 👍", text)
+            self.assertIn("<br>&lt;b&gt;Bob&lt;/b&gt; &amp; co: 👍", html)
+
+        asyncio.run(run())
+
+    def test_known_packet_copy_skips_reaction_heuristic(self):
+        async def run():
+            self.bridge.matrix_bot.send_message.side_effect = ["event_id_1", "event_id_3"]
+            g1 = ReceptionStats(gateway_id="G1", rssi=-80, snr=1.0)
+            await self.bridge.handle_meshtastic_message({"id": 1, "fromId": "!A", "decoded": {"text": "Hello"}}, "mqtt", g1)
+            # Orphan emoji is attached to the last packet by the heuristic
+            await self.bridge.handle_meshtastic_message({"id": 2, "fromId": "!B", "decoded": {"text": "👍"}}, "mqtt", g1)
+            await self.bridge.handle_meshtastic_message({"id": 3, "fromId": "!C", "decoded": {"text": "Next"}}, "mqtt", g1)
+
+            # A late copy of the reaction must not be re-linked to packet 3
+            await self.bridge.handle_meshtastic_message({"id": 2, "fromId": "!B", "decoded": {"text": "👍"}}, "lan",
+                                                        ReceptionStats(gateway_id="G2", rssi=-90, snr=1.0))
+            self.assertEqual(self.bridge.message_state[2].gateway_ids, {"G1", "G2"})
+            self.assertEqual(self.bridge.message_state[2].parent_packet_id, 1)
+            self.assertEqual(self.bridge.message_state[3].replies, [])
+
+        asyncio.run(run())
+
+    def test_state_stats_memoized_until_list_or_names_change(self):
+        async def run():
+            packet = {"id": 555, "fromId": "!Sender", "decoded": {"text": "Hello"}}
+            self.bridge.matrix_bot.send_message.return_value = "event_id_555"
+            await self.bridge.handle_meshtastic_message(packet, "mqtt", ReceptionStats(gateway_id="G1", rssi=-80, snr=1.0))
+            state = self.bridge.message_state[555]
+
+            with patch.object(self.bridge, '_format_stats', wraps=self.bridge._format_stats) as fmt:
+                first = self.bridge._state_stats(state)
+                self.assertEqual(self.bridge._state_stats(state), first)
+                self.assertEqual(fmt.call_count, 1)
+
+                await self.bridge.handle_meshtastic_message(packet, "lan", ReceptionStats(gateway_id="G2", rssi=-90, snr=1.0))
+                self.bridge._state_stats(state)
+                self.assertEqual(fmt.call_count, 2)
+
+                await self.bridge.handle_node_info("G1", "Gw1", None)
+                self.assertIn("Gw1", self.bridge._state_stats(state)[0])
+                self.assertEqual(fmt.call_count, 3)
+
+            await self.bridge._flush_pending_edits()
+
+        asyncio.run(run())
+
+    def test_mesh_text_is_html_escaped(self):
+        async def run():
+            packet = {"id": 808, "fromId": "!Sender", "decoded": {"text": "1 < 2 & <b>x</b>"}}
+            await self.bridge.handle_meshtastic_message(packet, "mqtt", ReceptionStats(gateway_id="G1", rssi=-80, snr=1.0))
+            text, html = self.bridge.matrix_bot.send_message.call_args[0]
+            self.assertIn("1 < 2 & <b>x</b>", text)
+            self.assertIn("1 &lt; 2 &amp; &lt;b&gt;x&lt;/b&gt;", html)
+
+        asyncio.run(run())
+
+    def test_legacy_text_reaction(self):
+        async def run():
+            stats = ReceptionStats(gateway_id="G1", rssi=-80, snr=1.0)
+            self.bridge.matrix_bot.send_message.return_value = "event_id_1"
+            await self.bridge.handle_meshtastic_message({"id": 1, "fromId": "!A", "decoded": {"text": "Hello"}}, "mqtt", stats)
+            await self.bridge.handle_meshtastic_message({"id": 2, "fromId": "!B", "decoded": {"text": "[Reaction to 1]: 👍"}}, "mqtt", stats)
+            self.assertEqual(self.bridge.message_state[1].replies, [2])
+            self.assertEqual(self.bridge.message_state[2].original_text, "👍")
+
+            # Our own node's reaction echoes are ignored
+            self.bridge.meshtastic_interface.node_id = "!Me"
+            await self.bridge.handle_meshtastic_message({"id": 3, "fromId": "!Me", "decoded": {"text": "[Reaction to 1]: 👍"}}, "mqtt", stats)
+            self.assertNotIn(3, self.bridge.message_state)
+
+        asyncio.run(run())
+
+    def test_quote_shortening(self):
+        self.assertEqual(_shorten("Original"), "Original")
+        self.assertEqual(_shorten("hello world " * 10), "hello world hello world hello world hello world…")
+        # A single overlong word is cut instead of collapsing to the placeholder
+        self.assertEqual(_shorten("x" * 80), "x" * 49 + "…")
+
+    def test_node_names_served_from_preloaded_map(self):
+        async def run():
+            self.assertEqual(self.bridge._node_name("!Node"), "!Node")
+
+            # NODEINFO updates the map in place
+            await self.bridge.handle_node_info("!Node", "NodeShort", "Node Long")
+            self.assertEqual(self.bridge._node_name("!Node"), "NodeShort")
+
+            stats = [ReceptionStats(gateway_id="!Node", rssi=-80, snr=1.0)]
+            self.assertIn("NodeShort", self.bridge._format_stats(stats)[0])
+            self.mock_node_db.get_node_name.assert_not_called()
+
+        asyncio.run(run())
+
+class TestMatrixBot(unittest.TestCase):
+    def test_display_name_lookups_are_shared_and_cached(self):
+        async def run():
+            bot = MatrixBot(MagicMock())
+            bot.client = MagicMock()
+            bot.client.rooms = {}
+
+            async def get_displayname(user_id):
+                await asyncio.sleep(0.01)
+                return ProfileGetDisplayNameResponse("Alice")
+            bot.client.get_displayname = AsyncMock(side_effect=get_displayname)
+
+            names = await asyncio.gather(*[bot.get_display_name("@alice:example.org") for _ in range(3)])
+            self.assertEqual(names, ["Alice"] * 3)
+            self.assertEqual(await bot.get_display_name("@alice:example.org"), "Alice")
+            bot.client.get_displayname.assert_awaited_once()
+
+        asyncio.run(run())
+
+    def test_send_queue_orders_messages_and_overlaps_edits(self):
+        async def run():
+            bot = MatrixBot(MagicMock())
+            bot.client = MagicMock()
+            active = []
+            overlapped = []
+            sent = []
+
+            async def room_send(room_id, message_type, content):
+                active.append(content["body"])
+                overlapped.append(len(active) > 1)
+                await asyncio.sleep(0.01)
+                active.remove(content["body"])
+                sent.append(content["body"])
+                return RoomSendResponse("$" + content["body"], "!room:example.org")
+            bot.client.room_send = AsyncMock(side_effect=room_send)
+            bot.client.close = AsyncMock()
+            bot._send_task = asyncio.create_task(bot._send_loop())
+
+            results = await asyncio.gather(
+                bot.send_message("first"),
+                bot.edit_message("$x", "edit-1"),
+                bot.send_message("second"),
+                bot.edit_message("$y", "edit-2"),
+            )
+            self.assertEqual(results, ["$first", None, "$second", None])
+            self.assertLess(sent.index("first"), sent.index("second"))
+            self.assertTrue(any(overlapped))
+            await bot.stop()
+
+        asyncio.run(run())
+
+    def test_queued_edits_of_same_event_are_coalesced(self):
+        async def run():
+            bot = MatrixBot(MagicMock())
+            bot.client = MagicMock()
+            bot.client.room_send = AsyncMock(return_value=RoomSendResponse("$edit", "!room:example.org"))
+            bot.client.close = AsyncMock()
+            bot._send_task = asyncio.create_task(bot._send_loop())
+
+            await asyncio.gather(
+                bot.edit_message("$a", "a1"),
+                bot.edit_message("$b", "b1"),
+                bot.edit_message("$a", "a2"),
+                bot.edit_message("$a", "a3"),
+            )
+            bodies = sorted(c.kwargs["content"]["body"] for c in bot.client.room_send.call_args_list)
+            self.assertEqual(bodies, ["a3", "b1"])
+            await bot.stop()
+
+        asyncio.run(run())
+
+    def test_stop_cancels_batch_in_progress(self):
+        async def run():
+            bot = MatrixBot(MagicMock())
+            bot.client = MagicMock()
+            async def room_send(**kwargs):
+                await asyncio.Event().wait() # never answers
+            bot.client.room_send = AsyncMock(side_effect=room_send)
+            bot.client.close = AsyncMock()
+            bot._send_task = asyncio.create_task(bot._send_loop())
+
+            edit = {"body": "a", "m.relates_to": {"rel_type": "m.replace", "event_id": "$a"}}
+            sends = [asyncio.create_task(bot._submit(content, ordered)) for content, ordered in
+                     [({"body": "1"}, True), ({"body": "2"}, True), (edit, False), (edit, False)]]
+            await asyncio.sleep(0.01)
+            await bot.stop()
+            results = await asyncio.wait_for(asyncio.gather(*sends, return_exceptions=True), 1)
+            self.assertTrue(all(isinstance(r, asyncio.CancelledError) for r in results))
+
+        asyncio.run(run())
+
+
+class TestMeshtasticInterface(unittest.TestCase):
+    @staticmethod
+    async def _connected(iface):
+        while iface._disconnect_future is None:
+            await asyncio.sleep(0.01)
+
+    def test_connect_reads_channels_from_local_node(self):
+        async def run():
+            # Like TCPInterface: channels live on localNode, not on the interface
+            channel = SimpleNamespace(index=0, settings=SimpleNamespace(name="LongFast"))
+            stub = SimpleNamespace(myInfo=SimpleNamespace(my_node_num=0x1234),
+                                   localNode=SimpleNamespace(channels=[channel]),
+                                   close=MagicMock())
+            iface = MeshtasticInterface(MagicMock())
+            with patch("meshtastic_interface.meshtastic.tcp_interface.TCPInterface", return_value=stub), \
+                 patch("meshtastic_interface.pub"):
+                task = asyncio.create_task(iface._connect_loop())
+                await asyncio.wait_for(self._connected(iface), 2)
+                self.assertIs(iface.interface, stub)
+                self.assertEqual(iface._channel_names, {0: "LongFast"})
+                self.assertEqual(iface.node_id, "!00001234")
+                task.cancel()
+                iface.stop()
+
+        asyncio.run(run())
+
+    def test_unreadable_channels_keep_connection(self):
+        async def run():
+            stub = SimpleNamespace(myInfo=SimpleNamespace(my_node_num=0x1234), close=MagicMock())
+            iface = MeshtasticInterface(MagicMock())
+            with patch("meshtastic_interface.meshtastic.tcp_interface.TCPInterface", return_value=stub), \
+                 patch("meshtastic_interface.pub"):
+                task = asyncio.create_task(iface._connect_loop())
+                await asyncio.wait_for(self._connected(iface), 2)
+                self.assertIs(iface.interface, stub)
+                self.assertEqual(iface._channel_names, {})
+                task.cancel()
+                iface.stop()
+
+        asyncio.run(run())
+
+    def test_unknown_channel_relayed_when_config_unreadable(self):
+        async def run():
+            bridge = MagicMock()
+            bridge.handle_meshtastic_message = AsyncMock()
+            iface = MeshtasticInterface(bridge)
+            # No localNode: re-reading the channel config fails
+            iface.interface = SimpleNamespace()
+            iface._channel_names = {0: "LongFast"}
+
+            iface._process_packet({"id": 1, "fromId": "!a", "channel": 3,
+                                   "decoded": {"portnum": "TEXT_MESSAGE_APP", "text": "hi"}})
+            await asyncio.gather(*iface._tasks)
+
+            packet = bridge.handle_meshtastic_message.call_args[0][0]
+            self.assertEqual(packet["channel_name"], "Unknown")
+            self.assertEqual(iface._channel_names, {0: "LongFast"})
+
+        asyncio.run(run())
+
+    def test_short_message_waits_for_split_message(self):
+        async def run():
+            iface = MeshtasticInterface(MagicMock())
+            sent = []
+
+            def send_text(text, channelIndex, replyId):
+                sent.append(text)
+                return SimpleNamespace(id=len(sent))
+            iface.interface = MagicMock()
+            iface.interface.sendText.side_effect = send_text
+
+            with patch("meshtastic_interface.BATCH_SEND_INTERVAL", 0.01):
+                iface._tx_task = asyncio.create_task(iface._tx_loop())
+                await iface.send_text_batch(["(1/3) a", "(2/3) b", "(3/3) c"])
+                packet = await (await iface.send_queued_text("hi"))
+
+            self.assertEqual(sent, ["(1/3) a", "(2/3) b", "(3/3) c", "hi"])
+            self.assertEqual(packet.id, 4)
+            iface._tx_task.cancel()
+            iface._io.shutdown()
+
+        asyncio.run(run())
+
+    def test_packets_dispatched_by_portnum_name(self):
+        async def run():
+            bridge = MagicMock()
+            bridge.handle_meshtastic_message = AsyncMock()
+            bridge.handle_node_info = AsyncMock()
+            iface = MeshtasticInterface(bridge)
+
+            iface._process_packet({"id": 1, "fromId": "!a", "channel": 0,
+                                   "decoded": {"portnum": "TEXT_MESSAGE_APP", "text": "hi"}})
+            iface._process_packet({"id": 2, "fromId": "!b",
+                                   "decoded": {"portnum": "NODEINFO_APP",
+                                               "user": {"shortName": "B", "longName": "Bob"}}})
+            iface._process_packet({"id": 3, "fromId": "!c", "decoded": {"portnum": "POSITION_APP"}})
+            await asyncio.gather(*iface._tasks)
+
+            bridge.handle_meshtastic_message.assert_awaited_once()
+            bridge.handle_node_info.assert_awaited_once_with("!b", "B", "Bob")
+
+        asyncio.run(run())
+
+
+class TestMqttClient(unittest.TestCase):
+    def test_start_without_broker_disables_mqtt(self):
+        async def run():
+            client = MqttClient(MagicMock())
+            client.client = MagicMock()
+            with patch("mqtt_client.config.MQTT_BROKER", None):
+                client.start()
+            client.client.connect_async.assert_not_called()
+            client.client.loop_start.assert_not_called()
+            client.stop()
+            client.client.disconnect.assert_not_called()
+
+        asyncio.run(run())
+
+    def test_start_with_invalid_broker_does_not_raise(self):
+        async def run():
+            client = MqttClient(MagicMock())
+            client.client = MagicMock()
+            client.client.connect_async.side_effect = ValueError("Invalid host.")
+            with patch("mqtt_client.config.MQTT_BROKER", "bad host"):
+                client.start()
+            self.assertIsNone(client._dispatch_task)
+            client.client.loop_start.assert_not_called()
+            client.stop()
+
+        asyncio.run(run())
+
+    def test_tapback_text_comes_from_payload(self):
+        client = MqttClient(MagicMock())
+        client.loop = MagicMock()
+        packet = mesh_pb2.MeshPacket(id=7, channel=0)
+        setattr(packet, 'from', 0xae614908)
+        packet.decoded.portnum = portnums_pb2.TEXT_MESSAGE_APP
+        packet.decoded.payload = "👍".encode("utf-8")
+        packet.decoded.reply_id = 1234
+        packet.decoded.emoji = 1
+
+        client._handle_decoded_packet(packet, MagicMock(), "LongFast")
+
+        enqueue, (handler, args) = client.loop.call_soon_threadsafe.call_args[0]
+        self.assertEqual(handler, client.bridge.handle_meshtastic_message)
+        packet_dict = args[0]
+        self.assertEqual(packet_dict["fromId"], "!ae614908")
+        self.assertEqual(packet_dict["decoded"]["text"], "👍")
+        self.assertEqual(packet_dict["decoded"]["replyId"], 1234)
+
+    def test_node_ids_are_zero_padded(self):
+        self.assertEqual(_node_id_to_str(0x1234), "!00001234")
+        self.assertEqual(_node_id_to_str(0xae614908), "!ae614908")
+
+    def test_decrypts_with_firmware_nonce_layout(self):
+        key = bytes(range(16))
+        client = MqttClient(MagicMock())
+        client._aes = algorithms.AES(key)
+        client._handle_decoded_packet = MagicMock()
+
+        data = mesh_pb2.Data(portnum=portnums_pb2.TEXT_MESSAGE_APP, payload=b"hello mesh")
+        packet = mesh_pb2.MeshPacket(id=0x01020304)
+        setattr(packet, 'from', 0xae614908)
+        nonce = (0x01020304).to_bytes(8, 'little') + (0xae614908).to_bytes(8, 'little')
+        encryptor = Cipher(algorithms.AES(key), modes.CTR(nonce)).encryptor()
+        packet.encrypted = encryptor.update(data.SerializeToString()) + encryptor.finalize()
+
+        client._try_decrypt(packet, MagicMock(), "LongFast")
+
+        decrypted = client._handle_decoded_packet.call_args[0][0]
+        self.assertEqual(decrypted.decoded.payload, b"hello mesh")
+
+
+class TestNodeDatabase(unittest.TestCase):
+    def test_updates_after_close_are_written_directly(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = NodeDatabase(os.path.join(tmp, "nodes.db"))
+            db.start_writer()
+            queued = db.queue_node_update("!00000001", short_name="ONE")
+            db.close()
+            late = db.queue_node_update("!00000002", long_name="Two")
+
+            self.assertEqual(queued.result(timeout=1), "ONE")
+            self.assertEqual(late.result(timeout=1), "Two")
+            self.assertEqual(db.load_all_names(), {"!00000001": "ONE", "!00000002": "Two"})
+
 if __name__ == '__main__':
     unittest.main()